@@ -0,0 +1,169 @@
+"""Storage engines for action-values(a 'q-table'), one row of values per state.
+Both classes share the same interface so a learning algorithm doesn't need to know which one it uses."""
+import numpy as np
+
+
+class DenseActionValues():
+	"""All action-values in one (n_states, n_actions) array, states must be integers in [0, n_states)"""
+
+	def __init__(self, n_states, n_actions, dtype=np.float32, array=None):
+		if array is None:
+			array = np.zeros((n_states, n_actions), dtype=dtype)
+		assert array.shape == (n_states, n_actions)
+
+		self.array = array
+
+	@property
+	def n_states(self):
+		return self.array.shape[0]
+
+	@property
+	def n_actions(self):
+		return self.array.shape[1]
+
+	def __contains__(self, state):
+		return 0 <= state < self.n_states
+
+	def __len__(self):
+		return self.n_states
+
+	def states(self):
+		return range(self.n_states)
+
+	def values(self, state):
+		"""Return action-values of a state(a view, so it can be modified in place)"""
+		return self.array[state]
+
+	def get(self, state):
+		return self.array[state]
+
+	def set_values(self, state, values):
+		self.array[state] = values
+
+	def value(self, state, action):
+		return self.array[state, action]
+
+	def max_value(self, state):
+		return self.array[state].max()
+
+	def rows(self, states):
+		"""Return action-values of many states as a (len(states), n_actions) array"""
+		return self.array[states]
+
+	def values_at(self, states, actions):
+		return self.array[states, actions]
+
+	def add(self, state, action, delta):
+		self.array[state, action] += delta
+
+	def add_many(self, states, actions, deltas):
+		"""Add deltas to many state/action pairs, repeated pairs get all their deltas"""
+		np.add.at(self.array, (states, actions), deltas)
+
+	def copy(self):
+		return DenseActionValues(self.n_states, self.n_actions, array=self.array.copy())
+
+	def can_copy_from(self, other):
+		return isinstance(other, DenseActionValues) and other.array.shape == self.array.shape
+
+	def copy_from(self, other):
+		"""Overwrite all values with those of another table of the same shape, without allocating"""
+		np.copyto(self.array, other.array)
+
+	def blend_from(self, other, tau):
+		"""Soft(Polyak) update: values = (1 - tau) * values + tau * other values"""
+		self.array *= 1 - tau
+		self.array += tau * other.array
+
+
+class SparseActionValues():
+	"""Action-values in a hash table, for state spaces that are unbounded or too large to allocate.
+	A row is created(filled with zeros) the first time a state is accessed."""
+
+	def __init__(self, n_actions, dtype=np.float32):
+		self._n_actions = n_actions
+		self.dtype = dtype
+		self.table = {}
+
+	@property
+	def n_actions(self):
+		return self._n_actions
+
+	def __contains__(self, state):
+		return state in self.table
+
+	def __len__(self):
+		return len(self.table)
+
+	def states(self):
+		return self.table.keys()
+
+	def values(self, state):
+		"""Return action-values of a state(a view, so it can be modified in place)"""
+		row = self.table.get(state)
+		if row is None:
+			row = np.zeros(self._n_actions, dtype=self.dtype)
+			self.table[state] = row
+		return row
+
+	def get(self, state):
+		"""Like 'values()', but return None instead of creating a row for unknown states"""
+		return self.table.get(state)
+
+	def set_values(self, state, values):
+		self.values(state)[:] = values
+
+	def value(self, state, action):
+		return self.values(state)[action]
+
+	def max_value(self, state):
+		return self.values(state).max()
+
+	def rows(self, states):
+		"""Return action-values of many states as a (len(states), n_actions) array"""
+		if len(states) == 0:
+			return np.zeros((0, self._n_actions), dtype=self.dtype)
+		return np.stack([self.values(state) for state in states.tolist()])
+
+	def values_at(self, states, actions):
+		return np.array([self.values(state)[action] for state, action in zip(states.tolist(), actions.tolist())], dtype=self.dtype)
+
+	def add(self, state, action, delta):
+		self.values(state)[action] += delta
+
+	def add_many(self, states, actions, deltas):
+		"""Add deltas to many state/action pairs, repeated pairs get all their deltas"""
+		for state, action, delta in zip(states.tolist(), actions.tolist(), deltas.tolist()):
+			self.values(state)[action] += delta
+
+	def copy(self):
+		other = SparseActionValues(self._n_actions, self.dtype)
+		other.table = {state: row.copy() for state, row in self.table.items()}
+		return other
+
+	def can_copy_from(self, other):
+		return isinstance(other, SparseActionValues) and other.n_actions == self.n_actions
+
+	def copy_from(self, other):
+		"""Overwrite values with those of another table, rows of this table are reused.
+		States only this table has keep their rows, the other table would create them as zeros"""
+		for state, row in other.table.items():
+			self.values(state)[:] = row
+		for state in self.table.keys() - other.table.keys():
+			self.table[state][:] = 0
+
+	def blend_from(self, other, tau):
+		"""Soft(Polyak) update: values = (1 - tau) * values + tau * other values"""
+		for state, row in other.table.items():
+			values = self.values(state)
+			values *= 1 - tau
+			values += tau * row
+		for state in self.table.keys() - other.table.keys():
+			self.table[state] *= 1 - tau
+
+
+if __name__ == '__main__':
+	for table in [DenseActionValues(10, 4), SparseActionValues(4)]:
+		table.add(3, 1, 0.5)
+		table.add(3, 2, 1.5)
+		print(type(table).__name__, table.values(3), "max:", table.max_value(3), "states:", len(table))
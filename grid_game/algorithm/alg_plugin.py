@@ -1,19 +1,21 @@
-import random
+from random_stream import default_stream
 
 class ActionSpace():
 	"""A class that describes all the actions can an agent can take in a particular environment"""
 
-	def __init__(self, action_list):
+	def __init__(self, action_list, rng=None):
 		"""
 		parameters
 			action_list:  a whole list of actions for this action space
+			rng:  a 'RandomStream' for sampling, the default stream if not given
 		"""
+		self.rng = rng if rng != None else default_stream()
 		self._action_list = action_list.copy()
 		self._n_actions = len(self._action_list)
 
 	def random_sample(self):
 		"""Uniform randomly return an action"""
-		return random.choice(self._action_list)
+		return self.rng.choice(self._action_list)
 
 	def action_at(self, index):
 		if index < self.n_actions:
@@ -44,11 +46,12 @@ class AlgPlugin():
 	def __init__(self):
 		pass
 
-	def layout(self, n_features, action_space, preset_states_list):
+	def layout(self, n_features, action_space, preset_states_list, n_states=None):
 		"""Environment uses this function to notify its layout.
-		The 'preset_states_list' is a list of tuple of form like: '(state, preset_value, is_terminal)'"""
+		The 'preset_states_list' is a list of tuple of form like: '(state, preset_value, is_terminal)'.
+		'n_states' is the number of states if the environment knows it, states are then integers in [0, n_states)"""
 
-		print("layout() is called, with arguments:", n_features, action_space, preset_states_list)
+		print("layout() is called, with arguments:", n_features, action_space, preset_states_list, n_states)
 	
 	def episode_start(self, episode, starting_state):
 		print("episode_start() is called, with arguments:", episode, starting_state)
@@ -59,6 +62,10 @@ class AlgPlugin():
 	def episode_end(self):
 		print("episode_end() is called")
 
+	def learn_batch(self, states, actions, rewards, states_next, terminals=None, weights=None):
+		"""Learn from a minibatch of recorded transitions(arrays, actions are action indexes), return TD errors"""
+		print("learn_batch() is called, with arguments:", states, actions, rewards, states_next, terminals, weights)
+
 	def next_action(self, state):
 		print("next_action() is called, with arguments:", state)
 
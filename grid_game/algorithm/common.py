@@ -1,48 +1,131 @@
-"""A class that provide selection algorithms"""
+"""A class that provide selection algorithms.
+Selection functions take either one row of action-values(returns an action index),
+or a 2d array with one row per state(returns an array of action indexes)."""
 import numpy as np
 
+from random_stream import default_stream
+
 def argmax_multi(data):
 	assert len(data) > 0
-	max = data[0]
-	indexes = []
-	for i, v in enumerate(data):
-		if v > max:
-			max = v
-			indexes = [i]  # this assignment operation may also delete previous max(now is not any more) elements
-		elif v == max:
-			indexes.append(i)
-	return indexes
+	data = np.asarray(data)
+	return np.flatnonzero(data == data.max()).tolist()
 
 def index_sub(a, b):
 	a = set(a)
 	b = set(b)
 	return list(a - b)
 
-def epsilon_greedy(epsilon, action_values):
-	n_actions = len(action_values)
+def _random_true(mask, rng):
+	"""For each row, uniform randomly pick the column of one of its True entries"""
+	return np.where(mask, rng.random_array(mask.shape), -1).argmax(axis=-1)
+
+def argmax_random(action_values, rng=None):
+	"""Index of max value, ties are broken uniform randomly"""
+	if rng is None:
+		rng = default_stream()
+	action_values = np.asarray(action_values)
+	if action_values.ndim == 1:
+		# a single row is short, plain python is faster than array operations on it
+		values = action_values.tolist()
+		best = max(values)
+		indexes = [i for i, v in enumerate(values) if v == best]
+		return indexes[int(rng.random() * len(indexes))]
+
+	is_max = action_values == action_values.max(axis=1, keepdims=True)
+	return _random_true(is_max, rng)
+
+def epsilon_greedy(epsilon, action_values, rng=None):
+	"""Take a max valued action with probability 'epsilon', otherwise one of the other actions"""
+	if rng is None:
+		rng = default_stream()
+	action_values = np.asarray(action_values)
+	n_actions = action_values.shape[-1]
 	assert n_actions >= 1
-	if n_actions == 1:
-		return 0
-	indexes = argmax_multi(action_values)
-	if np.random.random() > epsilon and len(indexes) < n_actions:
-		indexes = index_sub(range(n_actions), indexes)
-	return np.random.choice(indexes)
 
-def explore(steps, action_values):
-	explore_start = 0.9
-	explore_stop = 0.1
-	decay_rate = 0.0001
+	if action_values.ndim == 1:
+		if n_actions == 1:
+			return 0
+		values = action_values.tolist()
+		best = max(values)
+		indexes = [i for i, v in enumerate(values) if v == best]
+		if rng.random() > epsilon and len(indexes) < n_actions:
+			indexes = [i for i, v in enumerate(values) if v != best]
+		return indexes[int(rng.random() * len(indexes))]
+
+	is_max = action_values == action_values.max(axis=1, keepdims=True)
+	explore = (rng.random_array(len(action_values)) > epsilon) & ~is_max.all(axis=1)
+	is_max[explore] = ~is_max[explore]
+	return _random_true(is_max, rng)
+
+def softmax(temperature, action_values, rng=None):
+	"""Boltzmann exploration, take action i with probability proportional to exp(value_i / temperature)"""
+	if rng is None:
+		rng = default_stream()
+	action_values = np.asarray(action_values, dtype=np.float64)
+	rows = np.atleast_2d(action_values)
+	preferences = np.exp((rows - rows.max(axis=1, keepdims=True)) / temperature)
+	cumulative = np.cumsum(preferences, axis=1)
+	threshold = rng.random_array((len(rows), 1)) * cumulative[:, -1:]
+	action_index = (cumulative <= threshold).sum(axis=1)
+	if action_values.ndim == 1:
+		return int(action_index[0])
+	return action_index
+
+def ucb(c, action_values, counts, rng=None):
+	"""Upper confidence bound, take the action with max 'value + c * sqrt(ln(N) / n)',
+	where 'n' is how many times the action has been taken in that state and 'N' the sum over actions.
+	Actions never taken come first"""
+	action_values = np.asarray(action_values, dtype=np.float64)
+	counts = np.asarray(counts, dtype=np.float64)
+	total = np.maximum(counts.sum(axis=-1, keepdims=True), 1)
+	with np.errstate(divide='ignore', invalid='ignore'):
+		bonus = c * np.sqrt(np.log(total) / counts)
+	return argmax_random(np.where(counts == 0, np.inf, action_values + bonus), rng)
 
-	explore_rate = explore_stop + (explore_start - explore_stop)*np.exp(-decay_rate*steps)
+
+class ExplorationSchedule():
+	"""Exploration rate decaying exponentially from 'start' to 'stop' with the number of steps.
+	Rates are computed once into a table, steps past the end of the table get the 'stop' rate"""
+
+	def __init__(self, start=0.9, stop=0.1, decay_rate=0.0001, precision=1e-6):
+		self.start = start
+		self.stop = stop
+		self.decay_rate = decay_rate
+
+		# the table ends where the rate is within 'precision' of 'stop'
+		n_steps = 1
+		if start != stop and decay_rate > 0:
+			n_steps = int(np.ceil(np.log(abs(start - stop) / precision) / decay_rate)) + 1
+		self.rates = (stop + (start - stop)*np.exp(-decay_rate*np.arange(n_steps))).tolist()
+		self.rates[-1] = stop
+
+	def rate(self, steps):
+		if steps < len(self.rates):
+			return self.rates[steps]
+		return self.stop
+
+default_schedule = ExplorationSchedule()
+
+def explore(steps, action_values, rng=None):
+	explore_rate = default_schedule.rate(steps)
 
 	# wk_debug
 	#print("explore_rate:", explore_rate)
 	#if steps % 1000 == 0:
 		#print("step: {}, explore_rate: {}".format(steps, explore_rate))
 
-	return epsilon_greedy(1-explore_rate, action_values)
+	return epsilon_greedy(1-explore_rate, action_values, rng)
 
 
 if __name__ == "__main__":
 	a = explore(0, [1, 2, 3, 4])
 	print(a)
+
+	batch = np.random.randint(3, size=(5, 4))
+	print("action values:")
+	print(batch)
+	print("argmax:", argmax_random(batch))
+	print("explore:", explore(100000, batch))
+	print("softmax:", softmax(1.0, batch))
+	print("softmax of one row:", softmax(1.0, [1., 2., 3., 4.]))
+	print("ucb:", ucb(2.0, batch, np.random.randint(3, size=(5, 4))))
@@ -0,0 +1,110 @@
+import numpy as np
+
+from q_learning import QLearning
+from action_values import DenseActionValues
+
+class DynaQ(QLearning):
+	"""Q-learning plus planning: every real step also updates a learned deterministic model
+	(state, action) -> (reward, state_next), then 'planning_steps' transitions are replayed
+	from the model as one minibatch update."""
+
+	def __init__(self, alpha, gamma, epsilon, planning_steps=10, rng=None):
+		super().__init__(alpha, gamma, epsilon, rng=rng)
+		self.planning_steps = planning_steps
+
+		self._model_arrays = False
+		self._observed = np.zeros(0, dtype=np.int64)  # ids(state * n_actions + action) of observed pairs
+		self.n_observed = 0
+
+	def layout(self, n_features, action_space, preset_states_list, n_states=None):
+		super().layout(n_features, action_space, preset_states_list, n_states)
+
+		# the model is indexed like the q-table: arrays for a dense table, a hash table otherwise
+		n_actions = action_space.n_actions
+		self._model_arrays = isinstance(self.qtable, DenseActionValues)
+		if self._model_arrays:
+			size = len(self.qtable) * n_actions
+			self.model_rewards = np.zeros(size, dtype=np.float64)
+			self.model_states_next = np.zeros(size, dtype=np.int64)
+			self.model_known = np.zeros(size, dtype=bool)
+		else:
+			self.model = {}
+
+		self._observed = np.zeros(1024, dtype=np.int64)
+		self.n_observed = 0
+
+	def learn_model(self, state, action_index, reward, state_next):
+		pair = state * self.action_space.n_actions + action_index
+		if self._model_arrays:
+			is_new = not self.model_known[pair]
+			self.model_known[pair] = True
+			self.model_rewards[pair] = reward
+			self.model_states_next[pair] = state_next
+		else:
+			is_new = pair not in self.model
+			self.model[pair] = (reward, state_next)
+
+		if is_new:
+			if self.n_observed == len(self._observed):
+				self._observed = np.resize(self._observed, 2 * len(self._observed))
+			self._observed[self.n_observed] = pair
+			self.n_observed += 1
+
+	def plan(self, n=None):
+		"""Replay 'n'(default 'planning_steps') uniform randomly chosen observed pairs from the model.
+		Pairs are all different, so no more than 'n_observed' are replayed at a time"""
+		if n == None:
+			n = self.planning_steps
+		if n <= 0 or self.n_observed == 0:
+			return
+
+		pairs = self._observed[self.rng.distinct_integers(self.n_observed, n)]
+		states, actions = np.divmod(pairs, self.action_space.n_actions)
+		if self._model_arrays:
+			rewards = self.model_rewards[pairs]
+			states_next = self.model_states_next[pairs]
+		else:
+			transitions = [self.model[pair] for pair in pairs.tolist()]
+			rewards = np.array([t[0] for t in transitions], dtype=np.float64)
+			states_next = np.array([t[1] for t in transitions], dtype=np.int64)
+
+		self.learn_batch(states, actions, rewards, states_next)
+
+	def one_step(self, state, action, reward, state_next, weight=1):
+		next_action = super().one_step(state, action, reward, state_next, weight)
+
+		self.learn_model(state, self.action_space.action_index(action), reward, state_next)
+		self.plan()
+
+		return next_action
+
+
+if __name__ == '__main__':
+	from alg_plugin import ActionSpace
+
+	# a corridor of 10 states, reward only when reaching the right end
+	dyna = DynaQ(0.5, 0.9, 0.9, planning_steps=20)
+	dyna.layout(1, ActionSpace(['W', 'E']), [], n_states=10)
+	state = 0
+	action = dyna.episode_start(0, state)
+	while state != 9:
+		state_next = max(0, state - 1) if action == 'W' else state + 1
+		reward = 1 if state_next == 9 else 0
+		action = dyna.one_step(state, action, reward, state_next)
+		state = state_next
+	dyna.episode_end()
+
+	print("values of going east after one episode:", dyna.qtable.array[:, 1])
+	assert dyna.qtable.array.max() <= 1
+
+	# more planning steps than observed pairs, with a cost on every step: values must stay bounded
+	import sys
+	sys.path.append('..')
+	from grid_env import Env
+
+	env = Env((1, 4), default_rewards=-1, headless=True)
+	env.add_object('red_ball', (0, 3), terminal=True)
+	dyna = DynaQ(0.5, 0.9, 0.7, planning_steps=50)
+	env.train(dyna, 30, verbose=False)
+	print("values after 30 episodes of a 4 cell corridor:", dyna.qtable.array[:4])
+	assert np.isfinite(dyna.qtable.array).all() and dyna.qtable.array.min() >= -1 / (1 - 0.9)
@@ -0,0 +1,118 @@
+import heapq
+import itertools
+
+from q_learning import QLearning
+
+class PrioritizedSweeping(QLearning):
+	"""Q-learning with a learned deterministic model, where backups are done in order of |TD error|.
+
+	Every real step puts its (state, action) in a priority queue, then up to 'n_updates' top
+	priority pairs are backed up from the model. After a state's value changes, all pairs known
+	to lead to it(from the predecessor index) are queued with their own TD errors, so a reward
+	propagates backwards without wasting backups on pairs whose values wouldn't change."""
+
+	def __init__(self, alpha, gamma, epsilon, n_updates=10, theta=1e-4, rng=None):
+		"""
+		parameters
+			n_updates:  max number of backups after each real step
+			theta:  pairs with |TD error| not above this are not queued
+		"""
+		super().__init__(alpha, gamma, epsilon, rng=rng)
+		self.n_updates = n_updates
+		self.theta = theta
+
+		self._reset_model()
+
+	def _reset_model(self):
+		self.model = {}  # (state, action_index) -> (reward, state_next)
+		self.predecessors = {}  # state -> set of (state, action_index) that lead to it
+
+		# max-heap of (-priority, tie breaker, pair), '_queued' holds the live priority of each queued pair,
+		# heap entries that don't match it are stale and skipped
+		self.queue = []
+		self._queued = {}
+		self._counter = itertools.count()
+
+		self.n_backups = 0
+
+	def layout(self, n_features, action_space, preset_states_list, n_states=None):
+		super().layout(n_features, action_space, preset_states_list, n_states)
+		self._reset_model()
+
+	def _td_error(self, state, action_index, reward, state_next):
+		target = reward + self.gamma * self.value_callback(state_next, None)
+		return target - self.value_callback(state, action_index)
+
+	def _push(self, pair, priority):
+		if priority > self.theta and priority > self._queued.get(pair, 0):
+			self._queued[pair] = priority
+			heapq.heappush(self.queue, (-priority, next(self._counter), pair))
+
+	def _pop(self):
+		while self.queue:
+			priority, _, pair = heapq.heappop(self.queue)
+			if self._queued.get(pair) == -priority:
+				del self._queued[pair]
+				return pair
+		return None
+
+	def sweep(self, n=None):
+		"""Back up at most 'n'(default 'n_updates') top priority pairs"""
+		if n == None:
+			n = self.n_updates
+
+		for _ in range(n):
+			pair = self._pop()
+			if pair == None:
+				break
+
+			state, action_index = pair
+			reward, state_next = self.model[pair]
+			self.update_callback(state, action_index, self.alpha * self._td_error(state, action_index, reward, state_next))
+			self.n_backups += 1
+
+			# value of 'state' may have changed, re-check everything that leads to it
+			for predecessor in self.predecessors.get(state, ()):
+				p_reward, p_state_next = self.model[predecessor]
+				self._push(predecessor, abs(self._td_error(predecessor[0], predecessor[1], p_reward, p_state_next)))
+
+	def one_step(self, state, action, reward, state_next, weight=1):
+		action_index = self.action_space.action_index(action)
+		pair = (state, action_index)
+
+		# learn the model and the predecessor index
+		self.model[pair] = (reward, state_next)
+		self.predecessors.setdefault(state_next, set()).add(pair)
+
+		self.last_td_error = self._td_error(state, action_index, reward, state_next)
+		if abs(self.last_td_error) > self.episode_max_delta:
+			self.episode_max_delta = abs(self.last_td_error)
+		self._push(pair, abs(self.last_td_error) * weight)
+		self.sweep()
+
+		return self.action_space.action_at(self._next_action_index(state_next))
+
+
+if __name__ == '__main__':
+	from alg_plugin import ActionSpace
+	from common import epsilon_greedy
+	from dyna_q import DynaQ
+
+	# a deterministic corridor of 50 states, reward only at the right end, same planning budget for both
+	n = 50
+	for learner in [PrioritizedSweeping(1.0, 0.9, 0.9, n_updates=20), DynaQ(1.0, 0.9, 0.9, planning_steps=20)]:
+		learner.action_selection = lambda steps, values, rng=None: epsilon_greedy(0.9, values, rng)
+		learner.layout(1, ActionSpace(['W', 'E']), [], n_states=n)
+		steps = []
+		for episode in range(5):
+			state = 0
+			action = learner.episode_start(episode, state)
+			steps.append(0)
+			while state != n - 1:
+				state_next = max(0, state - 1) if action == 'W' else state + 1
+				reward = 1 if state_next == n - 1 else 0
+				action = learner.one_step(state, action, reward, state_next)
+				state = state_next
+				steps[-1] += 1
+			learner.episode_end()
+		print("{}: steps per episode {}, value at start {:.4f}".format(type(learner).__name__, steps, learner.qtable.max_value(0)))
@@ -1,8 +1,8 @@
 from td_learning import TDLearning
 
 class QLearning(TDLearning):
-	def __init__(self, alpha, gamma, epsilon):
-		super().__init__(alpha, gamma, 0, epsilon, False)
+	def __init__(self, alpha, gamma, epsilon, rng=None):
+		super().__init__(alpha, gamma, 0, epsilon, False, rng=rng)
 
 if __name__ == '__main__':
 	qlearning = QLearning(0.1, 0.99, 0.9)
@@ -0,0 +1,90 @@
+"""Random numbers for the environment and the learning algorithms.
+
+A 'RandomStream' wraps a 'numpy.random.Generator'. Single numbers are handed out from blocks
+that are drawn in bulk, which is much cheaper than one generator call per number.
+Streams are seeded with a 'numpy.random.SeedSequence', so independent child streams for
+worker processes can be spawned from one seed and every run is reproducible."""
+import numpy as np
+
+class RandomStream():
+	def __init__(self, seed=None, block_size=4096):
+		"""
+		parameters
+			seed:  None(fresh entropy), an int, or a numpy.random.SeedSequence
+			block_size:  how many numbers are drawn at once for 'random()'
+		"""
+		self.block_size = block_size
+		self.reseed(seed)
+
+	def reseed(self, seed=None):
+		if isinstance(seed, np.random.SeedSequence) == False:
+			seed = np.random.SeedSequence(seed)
+		self.seed_sequence = seed
+		self.generator = np.random.Generator(np.random.PCG64(seed))
+
+		self._block = []
+		self._pos = 0
+
+	def spawn(self, n):
+		"""Create 'n' independent child streams, e.g. one per worker process"""
+		return [RandomStream(child, self.block_size) for child in self.seed_sequence.spawn(n)]
+
+	def random(self):
+		"""A float in [0, 1)"""
+		i = self._pos
+		if i == len(self._block):
+			self._block = self.generator.random(self.block_size).tolist()
+			i = 0
+		self._pos = i + 1
+		return self._block[i]
+
+	def randint(self, n):
+		"""An int in [0, n)"""
+		return int(self.random() * n)
+
+	def choice(self, seq):
+		return seq[int(self.random() * len(seq))]
+
+	def random_array(self, size):
+		"""An array of floats in [0, 1), drawn directly from the generator"""
+		return self.generator.random(size)
+
+	def integers(self, high, size):
+		"""An array of ints in [0, high), drawn directly from the generator"""
+		return self.generator.integers(high, size=size)
+
+	def distinct_integers(self, high, size):
+		"""An array of min(size, high) different ints in [0, high), drawn directly from the generator"""
+		return self.generator.choice(high, min(size, high), replace=False)
+
+	def get_state(self):
+		"""return:
+			(generator state as a dict, array of numbers drawn but not yet handed out)"""
+		return (self.generator.bit_generator.state, np.array(self._block[self._pos:], dtype=np.float64))
+
+	def set_state(self, state):
+		"""Continue exactly where a stream was when 'get_state()' was called"""
+		generator_state, block = state
+		self.generator.bit_generator.state = generator_state
+		self._block = block.tolist()
+		self._pos = 0
+
+
+_default_stream = RandomStream()
+
+def default_stream():
+	"""The stream used by everything that isn't given its own"""
+	return _default_stream
+
+def seed(value):
+	"""Reseed the default stream, objects already holding it see the new sequence"""
+	_default_stream.reseed(value)
+
+
+if __name__ == "__main__":
+	stream = RandomStream(2024)
+	print("random:", [round(stream.random(), 3) for _ in range(3)])
+	print("choice:", [stream.choice(['N', 'S', 'W', 'E']) for _ in range(5)])
+
+	workers = stream.spawn(2)
+	print("worker streams:", [w.randint(100) for w in workers])
@@ -1,8 +1,8 @@
 from td_learning import TDLearning
 
 class Sarsa(TDLearning):
-	def __init__(self, alpha, gamma, lambda_, epsilon):
-		super().__init__(alpha, gamma, lambda_, epsilon, True)
+	def __init__(self, alpha, gamma, lambda_, epsilon, trace='replacing', trace_threshold=1e-4, rng=None):
+		super().__init__(alpha, gamma, lambda_, epsilon, True, trace, trace_threshold, rng=rng)
 
 if __name__ == '__main__':
 	sarsa = Sarsa(0.1, 0.99, 0, 0.9)
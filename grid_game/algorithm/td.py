@@ -1,22 +1,94 @@
 """A basic class for td-learning, eligibility(lambda) can be any number between [0, 1].
 This class can be used both for off-policy(Q-leaning) and on-policy(SARSA) learning algorithm."""
+import numpy as np
+
 class TD():
-	def __init__(self, alpha, gamma, eligibility, value_func_callback, update_func_callback):
+	# kinds of eligibility trace, how the trace of the current state/action is bumped on each step
+	trace_kinds = ('replacing', 'accumulating', 'dutch')
+
+	def __init__(self, alpha, gamma, eligibility, value_func_callback, update_func_callback,
+			trace='replacing', trace_threshold=1e-4, bulk_update_func_callback=None):
+		"""
+		parameters
+			trace:  'replacing'(trace is set to 1), 'accumulating'(trace is increased by 1)
+					or 'dutch'(trace becomes (1-alpha)*trace + 1)
+			trace_threshold:  traces that decay below this are dropped
+			bulk_update_func_callback:  optional function(states, actions, deltas) that takes arrays
+					and updates many state/action pairs at once, used instead of calling
+					'update_func_callback' once per traced pair
+		"""
+		assert trace in self.trace_kinds
+
 		# hyperparameters
 		self.alpha = alpha
 		self.gamma = gamma
 		self.eligibility = eligibility
+		self.trace = trace
+		self.trace_threshold = trace_threshold
 
 		# user of this class must provide value/update callback function
 		self.value_func = value_func_callback
 		self.update_func = update_func_callback
+		self.bulk_update_func = bulk_update_func_callback
 
+		# eligibility traces as parallel arrays, only the first 'n_traces' entries are in use.
+		# 'eligible' maps a (state, action) pair to its slot in these arrays
+		self.trace_states = np.zeros(64, dtype=np.int64)
+		self.trace_actions = np.zeros(64, dtype=np.int64)
+		self.trace_values = np.zeros(64, dtype=np.float64)
+		self.n_traces = 0
 		self.eligible = {}
 
 	def episode_start(self, start_state):
+		self.n_traces = 0
 		self.eligible = {}
 
-	def step(self, state, action, reward, state_next, action_next=None):
+	def _mark_eligible(self, state, action):
+		"""Bump the trace of a state/action pair according to the kind of trace"""
+		slot = self.eligible.get((state, action))
+		if slot is None:
+			if self.n_traces == len(self.trace_values):
+				self._grow_traces()
+			slot = self.n_traces
+			self.n_traces += 1
+			self.eligible[(state, action)] = slot
+			self.trace_states[slot] = state
+			self.trace_actions[slot] = action
+			self.trace_values[slot] = 1
+		elif self.trace == 'replacing':
+			self.trace_values[slot] = 1  # not using '+1', to normalize it
+		elif self.trace == 'accumulating':
+			self.trace_values[slot] += 1
+		else:
+			self.trace_values[slot] = (1 - self.alpha) * self.trace_values[slot] + 1
+
+	def _grow_traces(self):
+		size = 2 * len(self.trace_values)
+		self.trace_states = np.resize(self.trace_states, size)
+		self.trace_actions = np.resize(self.trace_actions, size)
+		self.trace_values = np.resize(self.trace_values, size)
+
+	def _decay_traces(self):
+		"""Decay all traces, and drop those that fall below the threshold"""
+		n = self.n_traces
+		values = self.trace_values[:n]
+		values *= self.eligibility
+
+		keep = values >= self.trace_threshold
+		if keep.all():
+			return
+
+		n = int(keep.sum())
+		self.trace_states[:n] = self.trace_states[:self.n_traces][keep]
+		self.trace_actions[:n] = self.trace_actions[:self.n_traces][keep]
+		self.trace_values[:n] = values[keep]
+		self.n_traces = n
+
+		self.eligible = {(s, a):i for i, (s, a) in enumerate(zip(self.trace_states[:n].tolist(), self.trace_actions[:n].tolist()))}
+
+	def step(self, state, action, reward, state_next, action_next=None, weight=1):
+		"""Learn from one transition and return its TD error.
+		'weight' scales the update, e.g. an importance-sampling weight of prioritized replay"""
 		# calculate predict value and target value
 		# use value callback to get value of state/action from user of this class
 		predict = self.value_func(state, action)
@@ -25,7 +97,8 @@ class TD():
 		target += reward
 
 		# calculate the 'Temporal Difference' between two states
-		delta = self.alpha * (target - predict)
+		td_error = target - predict
+		delta = self.alpha * weight * td_error
 
 		# if TD(0), won't bother to record eligibility
 		# so we can just use this function to learn in case of TD(0)
@@ -33,11 +106,18 @@ class TD():
 			self.update_func(state, action, delta)
 		else:
 			# propagate this difference back on the current episode
-			self.eligible[(state, action)] = 1  # not using '+1', to normalize it
-			for s_a, e in self.eligible.items():
-				self.update_func(s_a[0], s_a[1], delta*e)
-				self.eligible[s_a] *= self.eligibility
-			
+			self._mark_eligible(state, action)
+
+			n = self.n_traces
+			if self.bulk_update_func != None:
+				self.bulk_update_func(self.trace_states[:n], self.trace_actions[:n], delta*self.trace_values[:n])
+			else:
+				for s, a, e in zip(self.trace_states[:n].tolist(), self.trace_actions[:n].tolist(), self.trace_values[:n].tolist()):
+					self.update_func(s, a, delta*e)
+
+			self._decay_traces()
+
+		return td_error
 
-	def episode_end(self):	
+	def episode_end(self):
 		pass
@@ -1,14 +1,23 @@
 import numpy as np
-import copy
+import json
+import os
 
 from td import TD
-from alg_plugin import AlgPlugin
+from alg_plugin import AlgPlugin, ActionSpace
+from action_values import DenseActionValues, SparseActionValues
+from random_stream import default_stream
 import common
 
 class TDLearning(AlgPlugin):
-	def __init__(self, alpha, gamma, eligibility, epsilon, next_action_considered):
+	# use a dense q-table only if it has no more entries than this, otherwise use a hash table
+	dense_table_limit = 1 << 26
+
+	def __init__(self, alpha, gamma, eligibility, epsilon, next_action_considered, trace='replacing', trace_threshold=1e-4, target_tau=None, rng=None):
 		super().__init__()
 
+		# random stream for action selection
+		self.rng = rng if rng != None else default_stream()
+
 		# store the hyper parameters
 		self.alpha = alpha
 		self.gamma = gamma
@@ -23,8 +32,14 @@ class TDLearning(AlgPlugin):
 		self.action_selection = common.explore
 		self.steps = 0
 
+		# directed exploration, e.g. a 'visit_counts.UCBExploration': if set, it selects actions instead of
+		# 'action_selection'. 'intrinsic_reward'(e.g. a 'visit_counts.CountBonus') adds a bonus to rewards
+		self.exploration = None
+		self.intrinsic_reward = None
+
 		# use TD class to do the actual algorithm
-		self.td = TD(alpha, gamma, eligibility, self.value_callback, self.update_callback)
+		self.td = TD(alpha, gamma, eligibility, self.value_callback, self.update_callback,
+				trace, trace_threshold, self.bulk_update_callback)
 
 		# filled in when we know environment layout
 		self.n_features = None
@@ -33,11 +48,28 @@ class TDLearning(AlgPlugin):
 		# underlying storage for store value per action per state
 		# it's called 'q-table' just for convention, actually it can be used for any TD learning
 		# as long as the environment has finite number of states
-		self.qtable = {}  
+		self.qtable = None
+		self._table_attached = False
 
-		# delayed learning
+		# TD error of the latest 'one_step()', e.g. for updating priorities of replayed experience
+		self.last_td_error = 0
+
+		# max |TD error| since the episode started, e.g. for telling when learning has converged
+		self.episode_max_delta = 0.0
+
+		# delayed learning: agent acts on, and bootstraps from 'qtable', while updates go to 'qtable_future'.
+		# 'qtable' catches up either by copying 'qtable_future', or if 'target_tau' is set,
+		# by moving towards it by that fraction(soft update).
+		# the buffer that isn't in use is kept as a spare, so switching on and off allocates nothing
 		self.qtable_future = None
+		self._spare_table = None
 		self._delayed_learning = False
+		self.target_tau = target_tau
+
+		# states whose action-values changed since the last 'pop_changed_states()', e.g. for a display
+		# that only redraws what changed. nothing is recorded until the first call turns it on
+		self.track_changes = False
+		self.changed_states = set()
 
 	@property
 	def delayed_learning(self):
@@ -49,17 +81,47 @@ class TDLearning(AlgPlugin):
 
 		if onoff != self._delayed_learning:
 			if onoff == True:
-				self.qtable_future = copy.deepcopy(self.qtable)
+				spare = self._spare_table
+				self._spare_table = None
+				if spare != None and spare.can_copy_from(self.qtable):
+					spare.copy_from(self.qtable)
+				else:
+					spare = self.qtable.copy()
+				self.qtable_future = spare
 			else:
 				assert self.qtable_future != None
+				self._spare_table = self.qtable
 				self.qtable = self.qtable_future
 				self.qtable_future = None
+				self._all_changed()
 
 			self._delayed_learning = onoff
 
 	def delayed_learning_catchup(self):
 		if self._delayed_learning == True:
-			self.qtable = copy.deepcopy(self.qtable_future)
+			if self.target_tau == None:
+				self.qtable.copy_from(self.qtable_future)
+			else:
+				self.qtable.blend_from(self.qtable_future, self.target_tau)
+			self._all_changed()
+
+	def _all_changed(self):
+		if self.track_changes:
+			self.track_changes = False
+			self.changed_states = set()
+
+	def pop_changed_states(self):
+		"""Return the set of states whose action-values changed since the last call, and start over.
+		return None if that is unknown(first call, or the whole table changed), then every state
+		should be treated as changed"""
+		if self.track_changes == False:
+			self.track_changes = True
+			self.changed_states = set()
+			return None
+
+		changed = self.changed_states
+		self.changed_states = set()
+		return changed
 
 	def value_callback(self, state, action):
 		"""TD algorithm call this function to query action-value of a state"""
@@ -67,14 +129,12 @@ class TDLearning(AlgPlugin):
 		#print("value_callback(): state: {}, action: {}".format(state, action))
 
 		if action == None:
-			return np.max(self.qtable[state])
+			return self.qtable.max_value(state)
 		else:
 			if self.delayed_learning:
-				if self.qtable_future.get(state) == None:
-					self.qtable_future[state] = [np.float32(0)] * self.action_space.n_actions
-				return self.qtable_future[state][action]
+				return self.qtable_future.value(state, action)
 			else:
-				return self.qtable[state][action]
+				return self.qtable.value(state, action)
 
 	def update_callback(self, state, action, delta):
 		"""TD algorithm call this function to update action-value of a state"""
@@ -87,44 +147,72 @@ class TDLearning(AlgPlugin):
 				print("update_callback(): state: {}, action: {}, delta: {:.24f}".format(state, action, delta))
 
 		if self.delayed_learning:
-			if self.qtable_future.get(state) == None:
-				self.qtable_future[state] = [np.float32(0)] * self.action_space.n_actions
-			self.qtable_future[state][action] += np.float32(delta)
+			self.qtable_future.add(state, action, delta)
+		else:
+			self.qtable.add(state, action, delta)
+			if self.track_changes:
+				self.changed_states.add(state)
+
+	def bulk_update_callback(self, states, actions, deltas):
+		"""TD algorithm call this function to update action-values of many states at once"""
+		if self.delayed_learning:
+			self.qtable_future.add_many(states, actions, deltas)
 		else:
-			self.qtable[state][action] += np.float32(delta)
+			self.qtable.add_many(states, actions, deltas)
+			if self.track_changes:
+				self.changed_states.update(np.asarray(states).tolist())
 
 	##############################################################
 	#                                                            #
 	#    Below is the implementation of 'AlgPlugin' interface    #
 	#                                                            #
 	##############################################################
-	def layout(self, n_features, action_space, preset_states_list):
+	def attach_table(self, qtable):
+		"""Learn on an existing q-table(e.g. one shared between processes), instead of a new one.
+		'layout()' keeps an attached table and the step counter, so training continues where it was"""
+		self.qtable = qtable
+		self._table_attached = True
+		self._all_changed()
+
+	def layout(self, n_features, action_space, preset_states_list, n_states=None):
+		self.n_features = n_features
+		self.action_space = action_space
+
+		if self._table_attached == True:
+			assert self.qtable.n_actions == action_space.n_actions
+			assert n_states == None or n_states <= len(self.qtable) or isinstance(self.qtable, SparseActionValues)
+			self.qtable_future = None
+			self._spare_table = None
+			self._delayed_learning = False
+			return
+
 		# __experiment
 		self.steps = 0
 
-		self.n_features = n_features
-		self.action_space = action_space
-		self.qtable = {}
+		self.qtable = self._new_table(n_states)
+		self._all_changed()
 		self.qtable_future = None
+		self._spare_table = None
 		self._delayed_learning = False
 
 		for (state, value, is_terminal) in preset_states_list:
-			self.qtable[state] = [np.float32(value)] * self.action_space.n_actions
+			self.qtable.set_values(state, value)
+
+	def _new_table(self, n_states):
+		"""Create a dense q-table when the number of states is known and small enough"""
+		n_actions = self.action_space.n_actions
+		if n_states != None and n_states * n_actions <= self.dense_table_limit:
+			return DenseActionValues(n_states, n_actions)
+		else:
+			return SparseActionValues(n_actions)
 
 	def episode_start(self, episode, state):
 		#super().episode_start(episode, state)
-		if self.qtable.get(state) == None:
-			self.qtable[state] = [np.float32(0)] * self.action_space.n_actions
 		self.td.episode_start(state)
+		self.episode_max_delta = 0.0
 		return self.next_action(state)
 
-	def one_step(self, state, action, reward, state_next):
-		if self.qtable.get(state) == None:
-			self.qtable[state] = [np.float32(0)] * self.action_space.n_actions
-
-		if self.qtable.get(state_next) == None:
-			self.qtable[state_next] = [np.float32(0)] * self.action_space.n_actions
-
+	def one_step(self, state, action, reward, state_next, weight=1):
 		next_action_index = self._next_action_index(state_next)
 		if self.next_action_considered == True:
 			use_this_action = next_action_index
@@ -135,9 +223,64 @@ class TDLearning(AlgPlugin):
 		# assume that actions are non-negative integer
 		action_index = self.action_space.action_index(action)
 
-		self.td.step(state, action_index, reward, state_next, use_this_action)
+		if self.intrinsic_reward != None:
+			reward += self.intrinsic_reward.bonus(state, action_index)
+
+		self.last_td_error = self.td.step(state, action_index, reward, state_next, use_this_action, weight)
+		if abs(self.last_td_error) > self.episode_max_delta:
+			self.episode_max_delta = abs(self.last_td_error)
 		return self.action_space.action_at(next_action_index)
 
+	def learn_batch(self, states, actions, rewards, states_next, terminals=None, weights=None, actions_next=None):
+		"""Learn from a minibatch of transitions with array operations, return their TD errors.
+		parameters:
+			states, actions, rewards, states_next:  arrays of the same length, actions are action indexes
+			terminals:  whether each state_next is terminal, terminal states are not bootstrapped from
+			weights:  optional per transition weights that scale the updates(importance-sampling weights)
+			actions_next:  action indexes taken in state_next, only used by on-policy learning(SARSA),
+					selected by the current policy if not given
+		All deltas are computed from the values before this update and added in one scatter-add.
+		A state/action pair that appears k times is moved once, by '1-(1-alpha)**k' of its mean TD
+		error, which is where k sequential updates towards the same target would take it"""
+		states = np.asarray(states)
+		actions = np.asarray(actions)
+		states_next = np.asarray(states_next)
+
+		learning_table = self.qtable_future if self.delayed_learning else self.qtable
+		predict = learning_table.values_at(states, actions).astype(np.float64)
+
+		if self.next_action_considered == True:
+			if actions_next is None:
+				actions_next = self._next_action_indexes(states_next)
+			values_next = learning_table.values_at(states_next, np.asarray(actions_next))
+		else:
+			values_next = self.qtable.rows(states_next).max(axis=1)
+
+		if terminals is not None:
+			values_next = np.where(terminals, 0, values_next)
+
+		if self.intrinsic_reward != None:
+			rewards = rewards + self.intrinsic_reward.bonus_many(states, actions)
+
+		td_errors = rewards + self.gamma * values_next - predict
+		errors = td_errors * weights if weights is not None else td_errors
+
+		# adding the delta of every copy of a pair would overshoot its target, so merge copies first
+		pairs, first, inverse, counts = np.unique(states * self.action_space.n_actions + actions,
+				return_index=True, return_inverse=True, return_counts=True)
+		if len(pairs) < len(states):
+			mean_errors = np.bincount(inverse, weights=errors, minlength=len(pairs)) / counts
+			deltas = (1 - (1 - self.alpha) ** counts) * mean_errors
+			states = states[first]
+			actions = actions[first]
+		else:
+			deltas = self.alpha * errors
+
+		self.bulk_update_callback(states, actions, deltas)
+		if len(td_errors) > 0:
+			self.episode_max_delta = max(self.episode_max_delta, float(np.abs(td_errors).max()))
+		return td_errors
+
 	def episode_end(self):
 		# __experiment
 		self.steps += 1
@@ -145,12 +288,25 @@ class TDLearning(AlgPlugin):
 		self.td.episode_end()
 
 	def _next_action_index(self, state):
+		if self.exploration != None:
+			return self.exploration.select(state, self.qtable.values(state), rng=self.rng)
+
 		# __experiment
-		action_index = self.action_selection(self.steps, self.qtable[state])
+		action_index = self.action_selection(self.steps, self.qtable.values(state), rng=self.rng)
 		#print("next action index:", action_index)
 		return action_index
 		#return self.action_selection(self.epsilon, self.qtable[state])
 
+	def _next_action_indexes(self, states):
+		"""Select next action for a batch of states in one call"""
+		if self.exploration != None:
+			return self.exploration.select_many(states, self.qtable.rows(states), rng=self.rng)
+		return self.action_selection(self.steps, self.qtable.rows(states), rng=self.rng)
+
+	def next_action_indexes(self, states):
+		"""Given an array of states, based on selection algorithm select next action index for each of them"""
+		return self._next_action_indexes(np.asarray(states))
+
 	def next_action(self, state):
 		"""Given the current state, based on selection algorithm select next action for agent"""
 		action_index = self._next_action_index(state)
@@ -158,7 +314,7 @@ class TDLearning(AlgPlugin):
 
 	def best_action(self, state):
 		"""Select the action that has max value in a given state"""
-		action_index = np.argmax(self.qtable[state])
+		action_index = np.argmax(self.qtable.values(state))
 		return self.action_space.action_at(action_index)
 
 	def get_action_values(self, state):
@@ -166,16 +322,107 @@ class TDLearning(AlgPlugin):
 
 	def get_action_values_dict(self, state):
 		action_values = self.qtable.get(state)
-		if action_values == None:
+		if action_values is None:
 			return None
 		else:
 			action_values_dict = {self.action_space.action_at(i):v for i, v in enumerate(action_values)}
 			return action_values_dict
 
-	def whole_episode(self, one_episode):
-		self.episode_start(one_episode[0][0])
+	##############################################################
+	#                                                            #
+	#                       Checkpointing                        #
+	#                                                            #
+	##############################################################
+	checkpoint_version = 1
+
+	def save(self, path):
+		"""Save a checkpoint to directory 'path': the q-table as raw '.npy' arrays(so it can be
+		memory-mapped when loaded), plus a small JSON header with action space, hyperparameters,
+		step counter and the state of the random stream"""
+		os.makedirs(path, exist_ok=True)
+
+		# with delayed learning the newest values are in the future table
+		qtable = self.qtable_future if self._delayed_learning else self.qtable
+		if isinstance(qtable, DenseActionValues):
+			storage = 'dense'
+			np.save(os.path.join(path, 'qtable.npy'), qtable.array)
+		else:
+			storage = 'sparse'
+			states = np.array(list(qtable.states()), dtype=np.int64)
+			np.save(os.path.join(path, 'states.npy'), states)
+			np.save(os.path.join(path, 'values.npy'), qtable.rows(states))
+
+		generator_state, block = self.rng.get_state()
+		np.save(os.path.join(path, 'rng_block.npy'), block)
+
+		header = {'version': self.checkpoint_version,
+				'algorithm': type(self).__name__,
+				'storage': storage,
+				'n_actions': qtable.n_actions,
+				'action_list': self.action_space.action_list,
+				'n_features': self.n_features,
+				'hyperparameters': {'alpha': self.alpha,
+									'gamma': self.gamma,
+									'eligibility': self.eligibility,
+									'epsilon': self.epsilon,
+									'next_action_considered': self.next_action_considered,
+									'trace': self.td.trace,
+									'trace_threshold': self.td.trace_threshold,
+									'target_tau': self.target_tau},
+				'steps': self.steps,
+				'rng_state': generator_state}
+		with open(os.path.join(path, 'header.json'), 'w') as f:
+			json.dump(header, f, indent=1)
+
+	def load(self, path, mmap_mode=None):
+		"""Restore a checkpoint saved by 'save()', training resumes where it was.
+		The random stream is only restored if this learner has its own(passed as 'rng'). The default
+		stream is shared with the environment and every other learner, and rewinding it would change
+		their random numbers too. Give a learner its own stream to resume a run exactly.
+		parameters
+			mmap_mode:  None to read the q-table into memory, otherwise passed to 'numpy.load()':
+						'r'(read only, e.g. for 'Env.test()'), 'r+'(updates are written back to the file)
+						or 'c'(copy on write), pages of a mapped table are only read when touched
+		"""
+		with open(os.path.join(path, 'header.json')) as f:
+			header = json.load(f)
+		if header['version'] != self.checkpoint_version:
+			raise ValueError("unsupported checkpoint version: {}".format(header['version']))
+		if header['algorithm'] != type(self).__name__:
+			raise ValueError("checkpoint of {} can't be loaded into {}".format(header['algorithm'], type(self).__name__))
+
+		if header['storage'] == 'dense':
+			array = np.load(os.path.join(path, 'qtable.npy'), mmap_mode=mmap_mode)
+			qtable = DenseActionValues(array.shape[0], array.shape[1], array=array)
+		else:
+			states = np.load(os.path.join(path, 'states.npy'))
+			values = np.load(os.path.join(path, 'values.npy'), mmap_mode=mmap_mode)
+			qtable = SparseActionValues(header['n_actions'], values.dtype)
+			# rows are views of the(possibly mapped) values array
+			qtable.table = {state: values[i] for i, state in enumerate(states.tolist())}
+
+		hyperparameters = header['hyperparameters']
+		self.alpha = self.td.alpha = hyperparameters['alpha']
+		self.gamma = self.td.gamma = hyperparameters['gamma']
+		self.eligibility = self.td.eligibility = hyperparameters['eligibility']
+		self.td.trace = hyperparameters['trace']
+		self.td.trace_threshold = hyperparameters['trace_threshold']
+		self.epsilon = hyperparameters['epsilon']
+		self.next_action_considered = hyperparameters['next_action_considered']
+		self.target_tau = hyperparameters['target_tau']
+
+		if self.rng is not default_stream():
+			self.rng.set_state((header['rng_state'], np.load(os.path.join(path, 'rng_block.npy'))))
+
+		self.attach_table(qtable)
+		self.layout(header['n_features'], ActionSpace(header['action_list'], rng=self.rng), [])
+		self.steps = header['steps']
+
+	def whole_episode(self, one_episode, episode=0):
+		"""Learn from a recorded episode, a list of (state, action, reward, state_next)"""
+		self.episode_start(episode, one_episode[0][0])
 		for state, action, reward, state_next in one_episode:
-			self.step(state, action, reward, state_next)
+			self.one_step(state, action, reward, state_next)
 		self.episode_end()
 
 if __name__ == '__main__':
@@ -185,3 +432,13 @@ if __name__ == '__main__':
 
 	a = common.explore(10000, state_action)
 	print(a)
+
+	# a batch that repeats one terminal transition must not push the value past its target
+	from q_learning import QLearning
+	learner = QLearning(0.1, 0.9, 0.7)
+	learner.layout(1, ActionSpace(['W', 'E']), [], n_states=2)
+	n = 30
+	learner.learn_batch(np.zeros(n, dtype=np.int64), np.ones(n, dtype=np.int64), np.ones(n), np.ones(n, dtype=np.int64), np.ones(n, dtype=bool))
+	value = learner.qtable.values(0)[1]
+	print("value after {} copies of a transition with target 1: {:.4f}".format(n, value))
+	assert abs(value - (1 - 0.9**n)) < 1e-6
@@ -0,0 +1,131 @@
+"""How many times each (state, action) pair has been tried, and exploration strategies built on it.
+
+Visits are recorded into a small pending buffer and added to the count table in bulk with one
+scatter-add, either when the buffer is full or when counts are read. The table is a dense array
+that grows when a larger state shows up, so it can be created before the layout is known."""
+import numpy as np
+
+import common
+
+class VisitCounts():
+	def __init__(self, n_actions, n_states=0, buffer_size=4096):
+		self.n_actions = n_actions
+		self.array = np.zeros((n_states, n_actions), dtype=np.int64)
+
+		self._pending_states = np.zeros(buffer_size, dtype=np.int64)
+		self._pending_actions = np.zeros(buffer_size, dtype=np.int64)
+		self._n_pending = 0
+
+	def record(self, state, action_index):
+		"""Count one visit, it is added to the table later"""
+		n = self._n_pending
+		self._pending_states[n] = state
+		self._pending_actions[n] = action_index
+		self._n_pending = n + 1
+		if self._n_pending == len(self._pending_states):
+			self.flush()
+
+	def add_many(self, states, actions):
+		"""Count one visit of every (states[i], actions[i]), repeated pairs are counted every time"""
+		states = np.asarray(states)
+		if len(states) == 0:
+			return
+		self._grow(int(states.max()) + 1)
+		np.add.at(self.array, (states, np.asarray(actions)), 1)
+
+	def flush(self):
+		n = self._n_pending
+		if n == 0:
+			return
+		self._n_pending = 0
+		if n == 1:
+			state = int(self._pending_states[0])
+			self._grow(state + 1)
+			self.array[state, self._pending_actions[0]] += 1
+		else:
+			self.add_many(self._pending_states[:n], self._pending_actions[:n])
+
+	def _grow(self, n_states):
+		if n_states > len(self.array):
+			array = np.zeros((max(n_states, 2 * len(self.array)), self.n_actions), dtype=np.int64)
+			array[:len(self.array)] = self.array
+			self.array = array
+
+	def clear(self):
+		self._n_pending = 0
+		self.array[:] = 0
+
+	def counts(self, state):
+		"""Visits of each action in a state"""
+		self.flush()
+		if state < len(self.array):
+			return self.array[state]
+		return np.zeros(self.n_actions, dtype=np.int64)
+
+	def rows(self, states):
+		"""Visits of each action in many states, as a (len(states), n_actions) array"""
+		self.flush()
+		states = np.asarray(states)
+		if len(states) > 0:
+			self._grow(int(states.max()) + 1)
+		return self.array[states]
+
+	def state_counts(self):
+		"""Visits of every state, summed over actions"""
+		self.flush()
+		return self.array.sum(axis=1)
+
+	def cell_counts(self, n_cells):
+		"""Visits of every cell, summed over actions and over sets of picked up objects.
+		States are 'cell_id + n_cells * mask'(see 'StateEncoder'), so cells repeat every 'n_cells' states"""
+		state_counts = self.state_counts()
+		n_masks = -(-len(state_counts) // n_cells)
+		padded = np.zeros(n_masks * n_cells, dtype=np.int64)
+		padded[:len(state_counts)] = state_counts
+		return padded.reshape(n_masks, n_cells).sum(axis=0)
+
+	@property
+	def total(self):
+		return int(self.array.sum()) + self._n_pending
+
+
+class UCBExploration():
+	"""Action selection for 'TDLearning.exploration': the action with max 'value + c * sqrt(ln(N) / n)',
+	where 'n' counts tries of that action in the state and 'N' tries of all actions"""
+
+	def __init__(self, visit_counts, c=1.0):
+		self.visit_counts = visit_counts
+		self.c = c
+
+	def select(self, state, action_values, rng=None):
+		return common.ucb(self.c, action_values, self.visit_counts.counts(state), rng)
+
+	def select_many(self, states, action_values, rng=None):
+		return common.ucb(self.c, action_values, self.visit_counts.rows(states), rng)
+
+
+class CountBonus():
+	"""Intrinsic reward for 'TDLearning.intrinsic_reward': 'beta / sqrt(n)' is added to the reward of a
+	transition whose (state, action) has been tried 'n' times, so rarely tried actions look better"""
+
+	def __init__(self, visit_counts, beta=0.1):
+		self.visit_counts = visit_counts
+		self.beta = beta
+
+	def bonus(self, state, action_index):
+		n = self.visit_counts.counts(state)[action_index]
+		return self.beta / np.sqrt(max(n, 1))
+
+	def bonus_many(self, states, actions):
+		n = self.visit_counts.rows(states)[np.arange(len(states)), actions]
+		return self.beta / np.sqrt(np.maximum(n, 1))
+
+
+if __name__ == '__main__':
+	counts = VisitCounts(4)
+	for state, action in [(0, 1), (0, 1), (5, 3), (9, 0)]:
+		counts.record(state, action)
+	counts.add_many([5, 5], [3, 2])
+	print("state 5:", counts.counts(5), "total:", counts.total)
+	print("ucb in state 0:", UCBExploration(counts, 2.0).select(0, [0.5, 1.0, 0.0, 0.0]))
+	print("bonus of (0, 1):", CountBonus(counts).bonus(0, 1))
@@ -0,0 +1,12 @@
+"""Performance benchmarks for stepping the environment, learning and replay.
+
+Run from the 'grid_game' directory:
+	python -m benchmarks --output results.json
+	python -m benchmarks --baseline results.json --threshold 0.2
+	python -m benchmarks --quick --baseline
+The second form exits with status 1 if any benchmark got slower than the baseline by more than the
+threshold. '--baseline' without a file compares against 'benchmarks/baseline.json', the reference
+results committed with the code. Rates depend on the machine: that file was recorded with '--quick'
+on the machine described in its 'meta', and only means something for quick runs on a similar one.
+A baseline recorded in the other mode is refused, one from another machine gives a warning."""
+from benchmarks.runner import run, save, load, compare, meta_differences
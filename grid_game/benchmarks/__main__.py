@@ -0,0 +1,35 @@
+import argparse
+import sys
+
+from benchmarks.runner import run, save, load, compare, print_comparison, meta_differences, default_baseline
+
+parser = argparse.ArgumentParser(prog='python -m benchmarks', description='Run performance benchmarks')
+parser.add_argument('names', nargs='*', help='only run benchmarks whose name starts with one of these')
+parser.add_argument('--output', help='write results to this JSON file')
+parser.add_argument('--baseline', nargs='?', const=default_baseline,
+		help='compare results against this JSON file(without a file: benchmarks/baseline.json)')
+parser.add_argument('--threshold', type=float, default=0.2, help='allowed slowdown against the baseline, as a fraction')
+parser.add_argument('--quick', action='store_true', help='workloads a tenth of the size, for a fast check')
+args = parser.parse_args()
+
+baseline = None
+if args.baseline != None:
+	baseline = load(args.baseline)
+	if baseline['meta'].get('quick') != args.quick:
+		parser.error("baseline {} was recorded {} '--quick', run in the same mode to compare".format(args.baseline,
+				"with" if baseline['meta'].get('quick') else "without"))
+
+results = run(args.quick, args.names if args.names else None)
+if args.output != None:
+	save(results, args.output)
+
+if baseline != None:
+	differences = meta_differences(results, baseline)
+	if differences:
+		print("warning: baseline was recorded with a different {}, slowdowns may not be regressions".format(
+				', '.join("{}({} here)".format(key, results['meta'].get(key)) for key in differences)), file=sys.stderr)
+	rows = compare(results, baseline, args.threshold)
+	print()
+	print_comparison(rows)
+	if any(row[4] for row in rows):
+		sys.exit(1)
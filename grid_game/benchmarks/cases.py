@@ -0,0 +1,145 @@
+"""The benchmarks, each one returns a rate(operations per second, higher is better).
+
+Every benchmark builds what it needs first and only times the measured loop. Environments and
+learners get seeded random streams, so each run does the same work."""
+import numpy as np
+import sys
+import time
+
+sys.path.append('./algorithm')
+from grid_env import Env
+from layouts import layouts
+from memory import Memory, ReplayBuffer
+from q_learning import QLearning
+from sarsa import Sarsa
+from random_stream import RandomStream
+from common import epsilon_greedy
+
+def make_env(layout, grid_dimension=(8, 8), seed=0):
+	env = Env(grid_dimension, headless=True, rng=RandomStream(seed))
+	layouts[layout](env)
+	return env
+
+def best_rate(function, n, repeat):
+	"""Run 'function()'(which does 'n' operations) 'repeat' times, return the best operations per second"""
+	best = 0.0
+	for _ in range(repeat):
+		start = time.perf_counter()
+		function()
+		elapsed = time.perf_counter() - start
+		best = max(best, n / elapsed)
+	return best
+
+def env_step(env, n_steps, repeat):
+	actions = [env.action_space.action_at(i) for i in env.rng.integers(env.action_space.n_actions, n_steps).tolist()]
+
+	def run():
+		env.reset()
+		step = env.step
+		for action in actions:
+			if step(action)[2] == True:
+				env.reset()
+
+	return best_rate(run, n_steps, repeat)
+
+def record_transitions(env, n_steps):
+	"""Random walk through an environment, return a list of (state, action, reward, state_next, terminal)"""
+	transitions = []
+	env.reset()
+	state = env.calc_state()
+	for _ in range(n_steps):
+		action = env.action_space.random_sample()
+		reward, state_next, terminal = env.step(action)
+		transitions.append((state, action, reward, state_next, terminal))
+		if terminal == True:
+			env.reset()
+			state_next = env.calc_state()
+		state = state_next
+	return transitions
+
+def one_step(rl_algorithm, env, n_steps, repeat):
+	transitions = record_transitions(env, n_steps)
+	rl_algorithm.layout(1, env.action_space, [], env.n_states)
+
+	def run():
+		rl_algorithm.episode_start(0, transitions[0][0])
+		one_step = rl_algorithm.one_step
+		for state, action, reward, state_next, terminal in transitions:
+			one_step(state, action, reward, state_next)
+			if terminal == True:
+				rl_algorithm.episode_end()
+				rl_algorithm.episode_start(0, state_next)
+
+	return best_rate(run, n_steps, repeat)
+
+def memory_random_choice(capacity, batch_size, n_calls, repeat):
+	memory = Memory(capacity, rng=RandomStream(0))
+	for i in range(capacity):
+		memory.add((i, 'E', 0, i + 1))
+
+	def run():
+		for _ in range(n_calls):
+			memory.random_choice(batch_size)
+
+	return best_rate(run, n_calls, repeat)
+
+def replay_buffer_sample(capacity, batch_size, n_calls, repeat):
+	buffer = ReplayBuffer(capacity, rng=RandomStream(0))
+	states = np.arange(capacity)
+	buffer.add_batch(states, np.zeros(capacity, dtype=np.int64), np.zeros(capacity), states + 1, np.zeros(capacity, dtype=bool))
+
+	def run():
+		for _ in range(n_calls):
+			buffer.sample(batch_size)
+
+	return best_rate(run, n_calls, repeat)
+
+def train(env, n_episodes, repeat):
+	def run():
+		# the default exploration schedule mostly avoids the best action for the first thousands of
+		# episodes, which makes episode lengths(and so the rate) depend on luck. act greedily 90% of the time instead
+		rl_algorithm = QLearning(0.1, 0.9, 0.7, rng=RandomStream(1))
+		rl_algorithm.action_selection = lambda steps, values, rng=None: epsilon_greedy(0.9, values, rng)
+		env.train(rl_algorithm, n_episodes, verbose=False)
+
+	return best_rate(run, n_episodes, repeat)
+
+
+def all_benchmarks(quick=False):
+	"""return:
+		list of (name, unit, function), 'function()' runs the benchmark and returns its rate"""
+	scale = 0.1 if quick else 1
+	repeat = 3
+	n_steps = int(100000 * scale)
+	n_episodes = max(1, int(100 * scale))
+
+	benchmarks = []
+	for name in sorted(layouts):
+		if name == 'corridors':
+			continue
+		benchmarks.append(('env_step/' + name, 'steps/s', lambda name=name: env_step(make_env(name), n_steps, repeat)))
+	for size in (40, 100):
+		benchmarks.append(('env_step/corridors_{0}x{0}'.format(size), 'steps/s',
+				lambda size=size: env_step(make_env('corridors', (size, size)), n_steps, repeat)))
+
+	benchmarks.append(('one_step/qlearning', 'steps/s',
+			lambda: one_step(QLearning(0.1, 0.9, 0.7, rng=RandomStream(1)), make_env('layout4'), n_steps, repeat)))
+	benchmarks.append(('one_step/sarsa_lambda', 'steps/s',
+			lambda: one_step(Sarsa(0.1, 0.9, 0.7, 0.7, rng=RandomStream(1)), make_env('layout4'), n_steps, repeat)))
+
+	n_calls = int(1000 * scale)
+	for capacity in (1000, 10000, 100000):
+		benchmarks.append(('memory_random_choice/{}'.format(capacity), 'calls/s',
+				lambda capacity=capacity: memory_random_choice(capacity, 32, n_calls, repeat)))
+		benchmarks.append(('replay_buffer_sample/{}'.format(capacity), 'calls/s',
+				lambda capacity=capacity: replay_buffer_sample(capacity, 32, n_calls * 10, repeat)))
+
+	for name in sorted(layouts):
+		if name == 'corridors':
+			continue
+		benchmarks.append(('train/' + name, 'episodes/s', lambda name=name: train(make_env(name), n_episodes, repeat)))
+	for size in (16, 24):
+		benchmarks.append(('train/corridors_{0}x{0}'.format(size), 'episodes/s',
+				lambda size=size: train(make_env('corridors', (size, size)), n_episodes, repeat)))
+
+	return benchmarks
@@ -0,0 +1,65 @@
+"""Run benchmarks, save their results as JSON, and compare them against a baseline"""
+import json
+import os
+import platform
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.cases import all_benchmarks
+
+# reference results committed with the code, compared against by default
+default_baseline = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+def run(quick=False, selected=None, verbose=True):
+	"""Run all benchmarks whose name starts with one of 'selected'(all if None).
+	return:
+		results as a dict that can be saved with 'save()'"""
+	results = {}
+	for name, unit, function in all_benchmarks(quick):
+		if selected != None and not any(name.startswith(prefix) for prefix in selected):
+			continue
+		rate = function()
+		results[name] = {'rate': rate, 'unit': unit}
+		if verbose:
+			print("{:40s} {:14.1f} {}".format(name, rate, unit))
+
+	return {'meta': {'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+					'python': platform.python_version(),
+					'numpy': np.__version__,
+					'machine': platform.machine(),
+					'platform': platform.platform(),
+					'cpus': os.cpu_count(),
+					'quick': quick},
+			'results': results}
+
+def save(results, path):
+	with open(path, 'w') as f:
+		json.dump(results, f, indent=1, sort_keys=True)
+
+def load(path):
+	with open(path) as f:
+		return json.load(f)
+
+def meta_differences(results, baseline, keys=('machine', 'platform', 'cpus', 'python', 'numpy')):
+	"""Keys of 'meta' in which results and baseline differ, rates are only comparable if there are none"""
+	return [key for key in keys if results['meta'].get(key) != baseline['meta'].get(key)]
+
+def compare(results, baseline, threshold=0.2):
+	"""Compare rates of benchmarks that both have.
+	return:
+		list of (name, baseline rate, rate, ratio, regressed), a benchmark regressed if its rate
+		dropped by more than 'threshold'(a fraction) from the baseline"""
+	rows = []
+	for name, result in sorted(results['results'].items()):
+		if name not in baseline['results']:
+			continue
+		base_rate = baseline['results'][name]['rate']
+		ratio = result['rate'] / base_rate if base_rate > 0 else float('inf')
+		rows.append((name, base_rate, result['rate'], ratio, ratio < 1 - threshold))
+	return rows
+
+def print_comparison(rows, file=sys.stdout):
+	for name, base_rate, rate, ratio, regressed in rows:
+		print("{:40s} {:14.1f} -> {:14.1f}  x{:.2f}{}".format(name, base_rate, rate, ratio, "  REGRESSION" if regressed else ""), file=file)
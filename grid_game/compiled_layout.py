@@ -0,0 +1,79 @@
+import numpy as np
+
+
+class CompiledLayout():
+	"""The static layout of an 'Env'(walls and objects) turned into integer tables indexed by cell id.
+
+	Tables are numpy arrays so they can be used by vectorized code, the ones used by the
+	single agent 'Env.step()' are also kept as python lists because indexing a list with
+	a python int is much faster than indexing an array with it.
+	"""
+
+	move = {"N":(-1, 0), "S":(1, 0), "W":(0, -1), "E":(0, 1)}
+
+	def __init__(self, env):
+		grid = env.grid
+		n_cells = grid.n_cells
+		action_list = env.action_space.action_list
+
+		self.n_cells = n_cells
+		self.n_actions = len(action_list)
+
+		# cell index of every cell id
+		self.index_of = [grid.insure_index(cell_id) for cell_id in range(n_cells)]
+
+		# where each action leads from each cell, walls(including grid borders) block the move
+		walls = set(env.walls)
+		self.next_cell = np.empty((n_cells, self.n_actions), dtype=np.int64)
+		for cell_id, (row, column) in enumerate(self.index_of):
+			for i, action in enumerate(action_list):
+				d_row, d_column = self.move[action]
+				index_next = (row + d_row, column + d_column)
+				if index_next in walls:
+					self.next_cell[cell_id, i] = cell_id
+				else:
+					self.next_cell[cell_id, i] = grid.insure_id(index_next)
+
+		# objects, including those the agent is carrying right now
+		objects = [obj for obj in grid.cells if obj != None]
+		objects += env.agent.bag_of_objects
+
+		self.has_object = np.zeros(n_cells, dtype=bool)
+		self.object_reward = np.zeros(n_cells, dtype=np.float64)
+		self.terminal = np.zeros(n_cells, dtype=bool)
+		self.pickable_bit = np.zeros(n_cells, dtype=np.int64)  # 0 for cells without a pickable object
+
+		for obj in objects:
+			cell_id = grid.insure_id(obj.index_or_id)
+			self.has_object[cell_id] = True
+			self.object_reward[cell_id] = obj.reward
+			self.terminal[cell_id] = obj.terminal
+			if obj.pickable:
+				self.pickable_bit[cell_id] = env.encoder.bit_of(cell_id)
+
+		self.next_cell_list = self.next_cell.tolist()
+		self.has_object_list = self.has_object.tolist()
+		self.object_reward_list = self.object_reward.tolist()
+		self.terminal_list = self.terminal.tolist()
+		self.pickable_bit_list = self.pickable_bit.tolist()
+
+	def rewards(self, default_rewards):
+		"""Reward for leaving each cell when no object has been picked up"""
+		return np.where(self.has_object, self.object_reward, default_rewards)
+
+
+if __name__ == '__main__':
+	import sys
+	sys.path.append('./algorithm')
+	from grid_env import Env
+
+	env = Env((4, 4), headless=True)
+	env.set_walls([(1, 1), (2, 1)])
+	env.add_object('yellow_star', (0, 3), reward=10, pickable=True)
+	env.add_object('red_ball', (3, 3), terminal=True)
+
+	layout = CompiledLayout(env)
+	print("next cell per action:")
+	print(layout.next_cell)
+	print("rewards:", layout.rewards(-1))
+	print("terminal cells:", np.flatnonzero(layout.terminal))
@@ -1,5 +1,6 @@
 import tkinter as tk
 import threading
+from collections import OrderedDict
 
 from grid import Grid
 
@@ -75,21 +76,44 @@ drawing_function = {'red_ball': draw_red_ball,
 			'pacman': draw_pacman}
 
 
-"""A class that helps drawing shapes on a tkinter canvas"""
+"""A class that helps drawing shapes on a tkinter canvas.
+
+Tkinter must only be used from the thread that runs its mainloop, so the drawing methods don't
+touch the canvas, they put commands in a queue that the tkinter thread drains 'fps' times a second.
+Commands are keyed by what they draw(e.g. the text of one cell), a new command replaces a pending
+one with the same key, so a caller that draws faster than the frame rate never waits on tkinter
+and only the latest state of each cell is drawn."""
 class DrawingManager(threading.Thread):
 	class DrawingInfo():
 		def __init__(self):
 			self.image_canvas_id = None
 			self.text_canvas_id = None
 
-	def __init__(self, grid_dimension, cell_size):
+	def __init__(self, grid_dimension, cell_size, fps=30):
 		threading.Thread.__init__(self)
 
 		self.grid_dimension = grid_dimension
 		self.cell_size = cell_size
+		self.frame_interval = max(1, int(1000 / fps))  # milliseconds
 		self.agent_canvas_id = None
 		self.lock = threading.Lock()
 
+		# grid for converting cell indexes and ids, only read after this
+		self.grid = Grid(self.grid_dimension)
+		for i in range(self.grid.n_cells):
+			info = DrawingManager.DrawingInfo()
+			self.grid.cells.append(info)
+
+		# pending commands, key -> (function, args), in the order they are to be drawn
+		self._pending = OrderedDict()
+		self._pending_lock = threading.Lock()
+		self._n_commands = 0  # for keys of commands that never replace each other
+
+		# what the canvas will show once the queue is drained, kept on the caller's side
+		self._objects = set()  # (obj_type, cell_id)
+		self._agent_at = None
+		self._agent_angle = 0
+
 		# start running in new thread, use a lock to protect initializing stage
 		self.lock.acquire()
 		self.start()
@@ -101,6 +125,29 @@ class DrawingManager(threading.Thread):
 
 		return self
 
+	def _submit(self, key, function, *args):
+		"""Queue a command, replacing the pending command that has the same key"""
+		with self._pending_lock:
+			self._pending.pop(key, None)
+			self._pending[key] = (function, args)
+
+	def _submit_always(self, function, *args):
+		"""Queue a command that isn't merged with others"""
+		with self._pending_lock:
+			self._n_commands += 1
+			self._pending[('once', self._n_commands)] = (function, args)
+
+	def _drain(self):
+		"""Run in the tkinter thread: execute all pending commands, then schedule the next frame"""
+		with self._pending_lock:
+			pending = self._pending
+			self._pending = OrderedDict()
+
+		for function, args in pending.values():
+			function(*args)
+
+		self.window.after(self.frame_interval, self._drain)
+
 	def bounding_box(self, index_or_id):
 		"""Get a cell's bounding box coordinates"""
 
@@ -112,53 +159,110 @@ class DrawingManager(threading.Thread):
 		bottom = top + self.cell_size[1]
 		return (left, top, right, bottom)
 
+	##############################################################
+	#                                                            #
+	#    Drawing interface, called from any thread               #
+	#                                                            #
+	##############################################################
 	# draw the whole 'chess board' for this grid environment
 	def draw_grid(self):
-		for cell_id in range(self.grid.n_cells):
-			bbox = self.bounding_box(cell_id)
-			draw_cell_bbox(self.canvas, bbox)
-	
+		self._submit(('grid',), self._draw_grid)
+
 	def draw_object(self, obj_type, index_or_id):
 		cell_id = self.grid.insure_id(index_or_id)
-		bbox = self.bounding_box(index_or_id)
-
-		tag = obj_type + '_' + str(cell_id)
-		tag_of_this_type = obj_type + '_all'
-
-		self.canvas.delete(tag)
-		canvas_id = drawing_function[obj_type](self.canvas, bbox)
-
-		self.canvas.addtag_withtag(tag, canvas_id)
-		self.canvas.addtag_withtag(tag_of_this_type, tag)
-
-		# wk_debug
-		#print("tag:", self.canvas.find_withtag(tag))
-		#print("tag_of_cell:", self.canvas.find_withtag(tag_of_this_type))
-		#print("non-exist-tag:", self.canvas.find_withtag("abcdefg"))
-		#print("non-exist-tag len:", len(self.canvas.find_withtag("abcdefg")))
-
-		return canvas_id
+		self._objects.add((obj_type, cell_id))
+		self._submit(('object', obj_type, cell_id), self._draw_object, obj_type, cell_id)
 
 	def delete_object(self, obj_type, index_or_id):
 		cell_id = self.grid.insure_id(index_or_id)
-		tag = obj_type + '_' + str(cell_id)
-		#self.canvas.dtag(tag, tag_of_cell)
-		self.canvas.delete(tag)
+		self._objects.discard((obj_type, cell_id))
+		self._submit(('object', obj_type, cell_id), self._delete_tag, obj_type + '_' + str(cell_id))
 
 	def is_object_on_cell(self, obj_type, index_or_id):
 		cell_id = self.grid.insure_id(index_or_id)
-		tag = obj_type + '_' + str(cell_id)
-		
-		return len(self.canvas.find_withtag(tag))
+		return int((obj_type, cell_id) in self._objects)
 
 	def delete_objects_on_cell(self, index_or_id):
 		cell_id = self.grid.insure_id(index_or_id)
-		tag_of_cell = str(cell_id) + '_cell_id'
-		self.canvas.delete(tag_of_cell)
+		self._submit_always(self._delete_tag, str(cell_id) + '_cell_id')
 
 	def draw_text(self, index_or_id, text_dict):
-		bbox = self.bounding_box(index_or_id)
 		cell_id = self.grid.insure_id(index_or_id)
+		self._submit(('text', cell_id), self._draw_text, cell_id, dict(text_dict))
+
+	def delete_text(self, index_or_id):
+		cell_id = self.grid.insure_id(index_or_id)
+		self._submit(('text', cell_id), self._delete_tag, 'text_' + str(cell_id))
+
+	def draw_text_list(self, index_or_id, text_anchor_list):
+		cell_id = self.grid.insure_id(index_or_id)
+		self._submit(('text_list', cell_id), self._draw_text_list, cell_id, list(text_anchor_list))
+
+	def draw_trace(self, index_or_id, angle=0, ratio=0.5):
+		cell_id = self.grid.insure_id(index_or_id)
+		self._submit(('trace', cell_id), self._draw_trace, cell_id, angle, ratio)
+
+	def delete_trace(self):
+		# traces that are not drawn yet don't need to be
+		with self._pending_lock:
+			for key in [key for key in self._pending if key[0] == 'trace']:
+				del self._pending[key]
+		self._submit(('delete_trace',), self._delete_tag, 'all_trace')
+
+	def draw_heat(self, index_or_id, color):
+		"""Fill a cell with a color, below everything else on it"""
+		cell_id = self.grid.insure_id(index_or_id)
+		self._submit(('heat', cell_id), self._draw_heat, cell_id, color)
+
+	def delete_heat(self):
+		with self._pending_lock:
+			for key in [key for key in self._pending if key[0] == 'heat']:
+				del self._pending[key]
+		self._submit(('delete_heat',), self._delete_tag, 'all_heat')
+
+	# agent commands carry where the agent ends up(absolute place and angle), so they merge into one
+	def draw_agent(self, index_or_id, angle=0):
+		self._agent_at = self.grid.insure_id(index_or_id)
+		self._agent_angle = angle
+		self._submit(('agent',), self._place_agent, self._agent_at, angle)
+
+	def remove_agent(self):
+		self._agent_at = None
+		self._submit(('agent',), self._place_agent, None, 0)
+
+	def rotate_agent(self, index_or_id, rotate_angle):
+		self.draw_agent(index_or_id, rotate_angle)
+
+	def move_agent(self, index_or_id, index_or_id_next):
+		self.draw_agent(index_or_id_next, self._agent_angle)
+
+	##############################################################
+	#                                                            #
+	#    Canvas operations, only run in the tkinter thread       #
+	#                                                            #
+	##############################################################
+	def _draw_grid(self):
+		for cell_id in range(self.grid.n_cells):
+			bbox = self.bounding_box(cell_id)
+			draw_cell_bbox(self.canvas, bbox)
+
+	def _delete_tag(self, tag):
+		self.canvas.delete(tag)
+
+	def _draw_object(self, obj_type, cell_id):
+		bbox = self.bounding_box(cell_id)
+
+		tag = obj_type + '_' + str(cell_id)
+		tag_of_this_type = obj_type + '_all'
+
+		self.canvas.delete(tag)
+		canvas_id = drawing_function[obj_type](self.canvas, bbox)
+
+		self.canvas.addtag_withtag(tag, canvas_id)
+		self.canvas.addtag_withtag(tag_of_this_type, tag)
+
+	def _draw_text(self, cell_id, text_dict):
+		bbox = self.bounding_box(cell_id)
 		tag = 'text_' + str(cell_id)
 
 		self.canvas.delete(tag)
@@ -166,15 +270,9 @@ class DrawingManager(threading.Thread):
 		for anchor, text in text_dict.items():
 			canvas_id = draw_text(self.canvas, bbox, text, anchor_dict[anchor])
 			self.canvas.addtag_withtag(tag, canvas_id)
-		
-	def delete_text(self, index_or_id):
-		cell_id = self.grid.insure_id(index_or_id)
-		tag = 'text_' + str(cell_id)
-		self.canvas.delete(tag)
-		
-	def draw_text_list(self, index_or_id, text_anchor_list):
-		bbox = self.bounding_box(index_or_id)
-		cell_id = self.grid.insure_id(index_or_id)
+
+	def _draw_text_list(self, cell_id, text_anchor_list):
+		bbox = self.bounding_box(cell_id)
 		tag = 'text_list' + str(cell_id)
 
 		self.canvas.delete(tag)
@@ -182,11 +280,9 @@ class DrawingManager(threading.Thread):
 			canvas_id = draw_text(self.canvas, bbox, text, anchor)
 			self.canvas.addtag_withtag(tag, canvas_id)
 
-	def draw_trace(self, index_or_id, angle=0, ratio=0.5):
-		bbox = self.bounding_box(index_or_id)
+	def _draw_trace(self, cell_id, angle, ratio):
+		bbox = self.bounding_box(cell_id)
 		color = '#f8fff8'
-
-		cell_id = self.grid.insure_id(index_or_id)
 		tag = 'trace_'+str(cell_id)
 
 		self.canvas.delete(tag)  # delete old trace on this cell
@@ -197,32 +293,23 @@ class DrawingManager(threading.Thread):
 		self.canvas.addtag_withtag('all_trace', trace_canvas_id)
 		self.canvas.addtag_withtag(tag, trace_canvas_id)
 
-	def delete_trace(self):
-		self.canvas.delete('all_trace')
-		
-	def draw_agent(self, index_or_id, angle=0):
-		bbox = self.bounding_box(index_or_id)
-		self.agent_canvas_id = draw_pacman(self.canvas, bbox, angle)
-		
-	def remove_agent(self):
-		self.canvas.delete(self.agent_canvas_id)
+	def _draw_heat(self, cell_id, color):
+		tag = 'heat_' + str(cell_id)
 
-	def rotate_agent(self, index_or_id, rotate_angle):
-		bbox = self.bounding_box(index_or_id)
-
-		# tkinter doesn't support rotate a canvas element, so we delete then draw again
-		self.canvas.delete(self.agent_canvas_id)
-		self.agent_canvas_id = draw_pacman(self.canvas, bbox, rotate_angle)
+		self.canvas.delete(tag)
+		canvas_id = self.canvas.create_rectangle(*self.bounding_box(cell_id), fill=color, outline='')
+		self.canvas.tag_lower(canvas_id, None)
 
-	def move_agent(self, index_or_id, index_or_id_next):
-		bbox = self.bounding_box(index_or_id)
-		bbox_next = self.bounding_box(index_or_id_next)
+		self.canvas.addtag_withtag('all_heat', canvas_id)
+		self.canvas.addtag_withtag(tag, canvas_id)
 
-		move_x = bbox_next[0] - bbox[0]
-		move_y = bbox_next[1] - bbox[1]
-		self.canvas.move(self.agent_canvas_id, move_x, move_y)
-		#print("agent_canvas_id:{}, index:{}".format(self.agent_canvas_id, index_new))
-		#self.canvas.move(self.agent_canvas_id, 30, 30)
+	def _place_agent(self, cell_id, angle):
+		# tkinter doesn't support rotate a canvas element, so we delete then draw again
+		if self.agent_canvas_id != None:
+			self.canvas.delete(self.agent_canvas_id)
+			self.agent_canvas_id = None
+		if cell_id != None:
+			self.agent_canvas_id = draw_pacman(self.canvas, self.bounding_box(cell_id), angle)
 
 	def run(self):
 		# create tkinter window
@@ -243,13 +330,8 @@ class DrawingManager(threading.Thread):
 		self.canvas = canvas
 		self.origin = (10, 10)	# canvas has 10 pixels margin from window borders
 
-		# create grid for saving drawing info
-		self.grid = Grid(self.grid_dimension)
-		for i in range(self.grid.n_cells):
-			info = DrawingManager.DrawingInfo()
-			self.grid.cells.append(info)
-
 		self.lock.release()
 
-		# enter window mainloop
+		# draw queued commands at a fixed frame rate, then enter window mainloop
+		self.window.after(self.frame_interval, self._drain)
 		self.window.mainloop()
@@ -0,0 +1,133 @@
+"""Run a grid of experiments(layouts x algorithms x hyperparameters) on all cores.
+
+An experiment grid is a dict, every value that is a list is swept over, for example:
+	{'layout': ['layout1', 'layout4'], 'algorithm': ['QLearning', 'Sarsa'],
+	 'alpha': [0.1, 0.5], 'gamma': 0.9, 'epsilon': 0.7, 'lambda_': 0.7, 'n_episodes': 2000}
+Each run trains in its own process with a headless environment, and its result is appended
+to a JSON lines file as soon as it finishes."""
+import numpy as np
+import itertools
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+sys.path.append('./algorithm')
+from grid_env import Env
+from layouts import layouts
+from q_learning import QLearning
+from sarsa import Sarsa
+from action_values import DenseActionValues
+from random_stream import RandomStream
+
+# values used when an experiment grid doesn't give them
+run_defaults = {'grid_dimension': (8, 8),
+			'default_rewards': 0,
+			'algorithm': 'QLearning',
+			'alpha': 0.1,
+			'gamma': 0.9,
+			'epsilon': 0.7,
+			'lambda_': 0.7,
+			'n_episodes': 1000}
+
+def expand_grid(grid):
+	"""Return one run config(a dict) for every combination of the swept values"""
+	keys = sorted(grid.keys())
+	choices = [grid[key] if isinstance(grid[key], list) else [grid[key]] for key in keys]
+
+	configs = []
+	for values in itertools.product(*choices):
+		config = dict(run_defaults)
+		config.update(zip(keys, values))
+		configs.append(config)
+	return configs
+
+def make_algorithm(config, rng):
+	if config['algorithm'] == 'QLearning':
+		return QLearning(config['alpha'], config['gamma'], config['epsilon'], rng=rng)
+	elif config['algorithm'] == 'Sarsa':
+		return Sarsa(config['alpha'], config['gamma'], config['lambda_'], config['epsilon'], rng=rng)
+	else:
+		raise ValueError("unknown algorithm: {}".format(config['algorithm']))
+
+def save_qtable(qtable, path):
+	"""Save a q-table as '.npy'(dense) or '.npz' with 'states' and 'values'(sparse), return the file name"""
+	if isinstance(qtable, DenseActionValues):
+		path += '.npy'
+		np.save(path, qtable.array)
+	else:
+		path += '.npz'
+		states = np.array(list(qtable.states()), dtype=np.int64)
+		np.savez(path, states=states, values=qtable.rows(states))
+	return path
+
+def run_one(run_id, config, seed_sequence, output_dir=None):
+	"""Train one config in a headless environment and return its result as a dict"""
+	env_rng, algorithm_rng = RandomStream(seed_sequence).spawn(2)
+
+	env = Env(tuple(config['grid_dimension']), default_rewards=config['default_rewards'], headless=True, rng=env_rng)
+	layouts[config['layout']](env)
+	rl_algorithm = make_algorithm(config, algorithm_rng)
+
+	start = time.time()
+	returns, lengths = env.train(rl_algorithm, config['n_episodes'], verbose=False)
+	wall_time = time.time() - start
+
+	qtable_path = None
+	if output_dir != None:
+		qtable_path = save_qtable(rl_algorithm.qtable, os.path.join(output_dir, 'run_{}_qtable'.format(run_id)))
+
+	return {'run_id': run_id,
+			'config': config,
+			'returns': returns,
+			'steps': lengths,
+			'total_steps': int(sum(lengths)),
+			'wall_time': wall_time,
+			'qtable_path': qtable_path}
+
+def run_experiments(grid, results_path, output_dir=None, max_workers=None, seed=None):
+	"""Fan out all runs of an experiment grid over a process pool.
+	parameters:
+		results_path:  JSON lines file, one result is appended per finished run
+		output_dir:  where final q-tables are saved, not saved if None
+		max_workers:  number of processes, all cores if None
+		seed:  root seed, every run gets its own independent stream spawned from it
+	return:
+		number of runs that failed
+	"""
+	configs = expand_grid(grid)
+	seeds = np.random.SeedSequence(seed).spawn(len(configs))
+	if output_dir != None:
+		os.makedirs(output_dir, exist_ok=True)
+
+	failed = 0
+	with ProcessPoolExecutor(max_workers=max_workers) as pool:
+		futures = {pool.submit(run_one, i, config, seeds[i], output_dir):i for i, config in enumerate(configs)}
+
+		with open(results_path, 'a') as results_file:
+			for future in as_completed(futures):
+				run_id = futures[future]
+				try:
+					result = future.result()
+				except Exception as e:
+					failed += 1
+					result = {'run_id': run_id, 'config': configs[run_id], 'error': repr(e)}
+				else:
+					print("run {} finished: {} steps in {:.2f} seconds".format(run_id, result['total_steps'], result['wall_time']))
+
+				results_file.write(json.dumps(result) + '\n')
+				results_file.flush()
+
+	return failed
+
+
+if __name__ == '__main__':
+	grid = {'layout': ['layout1', 'layout2', 'layout5'],
+			'algorithm': ['QLearning', 'Sarsa'],
+			'alpha': [0.1, 0.5],
+			'n_episodes': 200}
+
+	print("{} runs".format(len(expand_grid(grid))))
+	failed = run_experiments(grid, 'experiment_results.jsonl', output_dir='experiment_qtables', seed=0)
+	print("failed runs:", failed)
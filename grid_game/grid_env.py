@@ -1,14 +1,18 @@
 import numpy as np
-import tkinter as tk
+import os
 import time
-import random
 import sys
 
 from grid import Grid
-from drawing import DrawingManager
+from null_drawing import NullDrawingManager
+from state_encoder import StateEncoder
+from compiled_layout import CompiledLayout
 sys.path.append('./algorithm')
 from alg_plugin import ActionSpace
-from memory import Memory
+from random_stream import default_stream
+from visit_counts import VisitCounts
+from memory import ReplayBuffer, PrioritizedReplayBuffer
+from metrics import LearningCurve
 
 
 class GridObject():
@@ -63,11 +67,15 @@ class GridObject():
 	@label.setter
 	def label(self, text):
 		self._label = text
-		if text != None:
+		if text != None and self.drawing_manager != None:
 			self.drawing_manager.draw_text(self.index_or_id, {'C':text})
 
 
 class Agent():
+	# picking up this many objects earns the agent an extra credit when it reaches a terminal
+	full_bag = 8
+	full_bag_credit = 10000
+
 	def __init__(self, born_at=(0, 0), facing='E', drawing_manager=None):
 		# save parameters and don't change after init
 		self._born_at = born_at
@@ -96,12 +104,16 @@ class Agent():
 		self.cur_facing = self.facing
 
 		if show == True:
-			angle = self._angle_from_facing(self.cur_facing)
-			self.drawing_manager.remove_agent()
-			self.drawing_manager.draw_agent(self.cur_at, angle)
+			self.draw()
+
+	def draw(self):
+		"""Draw agent at its current location without moving it"""
+		angle = self._angle_from_facing(self.cur_facing)
+		self.drawing_manager.remove_agent()
+		self.drawing_manager.draw_agent(self.cur_at, angle)
 
-			# delete previous traces so we don't mess up the environment
-			self.drawing_manager.delete_trace()
+		# delete previous traces so we don't mess up the environment
+		self.drawing_manager.delete_trace()
 
 	def one_step_to(self, to_index, facing, show=True):
 		if show == True:
@@ -123,8 +135,8 @@ class Agent():
 		#self.credit += obj.reward
 
 		items = len(self.bag)
-		if items == 8:
-			self.credit = 10000
+		if items == self.full_bag:
+			self.credit = self.full_bag_credit
 			self.pickup_all += 1
 
 	def drop(self):
@@ -185,11 +197,16 @@ class Agent():
 
 
 class Env():
-	def __init__(self, grid_dimension=(10, 10), cell_size=(120, 90), default_rewards=0, agent_born_at=(0, 0), agent_born_facing='E'):
+	def __init__(self, grid_dimension=(10, 10), cell_size=(120, 90), default_rewards=0, agent_born_at=(0, 0), agent_born_facing='E', headless=False, prioritized_replay=False, rng=None):
 		# create grid and add data to it
 		self.grid = Grid(grid_dimension)
 		self.grid.cells = [None] * self.grid.n_cells
 
+		# maps agent's cell plus the set of objects in its bag to a state number,
+		# 'picked_mask' is the bitmask of objects in agent's bag, updated on pickup and drop
+		self.encoder = StateEncoder(self.grid.n_cells)
+		self.picked_mask = 0
+
 		# set walls, user can still call .set_walls() to add new walls
 		self.walls = []
 		height, width = grid_dimension
@@ -199,30 +216,63 @@ class Env():
 		for column in range(width):
 			self.walls.append((-1, column))
 			self.walls.append((height, column))
+		self._wall_set = set(self.walls)
+
+		# in headless mode there is no renderer at all and tkinter is never imported,
+		# otherwise create a drawing manager, which creates a tkinter window in a new thread
+		if headless == True:
+			self.renderer = None
+		else:
+			from drawing import DrawingManager
+			self.renderer = DrawingManager(grid_dimension, cell_size).wait()
+			# draw grid
+			self.renderer.draw_grid()
+
+		# the drawing manager that objects and agent actually draw with,
+		# it is the null backend whenever the environment is not shown
+		self._null_drawing_manager = NullDrawingManager()
+		self.drawing_manager = self.renderer if self.renderer != None else self._null_drawing_manager
+
+		# whether environment changes should be displayed on screen
+		self._show = self.renderer != None
+
+		# action-value text last drawn on each cell, and the set of picked up objects it was drawn for,
+		# so the display only redraws cells whose text changed
+		self._shown_text = {}
+		self._shown_mask = None
+		self._stale_cells = set()  # cells whose text was wiped, to be redrawn even if their values didn't change
 
-		# create a drawing manager, which creates a tkinter window in a new thread
-		self.drawing_manager = DrawingManager(grid_dimension, cell_size).wait()
-		# draw grid
-		self.drawing_manager.draw_grid()
+		# the stop criterion that ended the last 'train()' early, if any
+		self.stopped_by = None
 
 		self.default_rewards = default_rewards
 
+		# random stream shared by everything in this environment
+		self.rng = rng if rng != None else default_stream()
+
 		# create an action space
-		self.action_space = ActionSpace(self.env_actions)
+		self.action_space = ActionSpace(self.env_actions, self.rng)
+		self._action_index = self.action_space.action_dict
+
+		# tables compiled from walls and objects, built on first use
+		self._compiled_layout = None
 
 		# create agent and set its born location and facing direction
 		self.agent = Agent(agent_born_at, agent_born_facing, drawing_manager=self.drawing_manager)
 		self.agent.reset()
 
 		# create memory for learning from old experience
-		self.history = Memory(2000)
+		if prioritized_replay == True:
+			self.history = PrioritizedReplayBuffer(2000, rng=self.rng)
+		else:
+			self.history = ReplayBuffer(2000, rng=self.rng)
 
-		# keep counts of access times for each cell
-		self.access_counter = Grid(grid_dimension)
-		self.access_counter.cells = [0] * self.access_counter.n_cells
+		# keep counts of how many times each action has been taken in each state
+		self.visit_counts = VisitCounts(self.action_space.n_actions)
 
-		# whether environment changes should be displayed on screen
-		self._show = True
+	@property
+	def headless(self):
+		return self.renderer == None
 
 	@property
 	def show(self):
@@ -230,54 +280,88 @@ class Env():
 
 	@show.setter
 	def show(self, onoff):
+		if onoff == self._show:
+			return
+		if onoff == True and self.renderer == None:
+			raise ValueError("a headless environment can't be shown")
+
 		self._show = onoff
+		self._attach_drawing_manager(self.renderer if onoff else self._null_drawing_manager)
 
-	def calc_state(self):
-		factor = self.grid.n_cells
-		state = 0
+		# changes made while hidden were never drawn, so bring the window up to date
+		if onoff == True:
+			self._redraw()
+
+	def _attach_drawing_manager(self, drawing_manager):
+		"""Switch the drawing backend used by the agent and by every object in the environment"""
+		self.drawing_manager = drawing_manager
+		self.agent.drawing_manager = drawing_manager
+		for obj in self.grid.cells:
+			if obj != None:
+				obj.drawing_manager = drawing_manager
 		for obj in self.agent.bag_of_objects:
-			cell_id = self.grid.insure_id(obj.index_or_id) + 1
-			state += cell_id
-			state *= factor
+			obj.drawing_manager = drawing_manager
+
+	def _redraw(self):
+		for cell_id in range(self.grid.n_cells):
+			for obj_type in self.object_types:
+				self.drawing_manager.delete_object(obj_type, cell_id)
+			self.drawing_manager.delete_text(cell_id)
+
+			obj = self.grid.cell_at(cell_id)
+			if obj != None:
+				obj.draw()
 
-		state += self.grid.insure_id(self.agent.cur_at)
-		return state
+		self.agent.draw()
+		self._forget_shown_text()
+
+	@property
+	def n_states(self):
+		return self.encoder.n_states
+
+	def calc_state(self):
+		cell_id = self.grid.insure_id(self.agent.cur_at)
+		return self.encoder.encode(cell_id, self.picked_mask)
 		
 	def index_from_state(self, state):
-		factor = self.grid.n_cells
-		cell_id = state % factor
+		cell_id, mask = self.encoder.decode(state)
 		index = self.grid.insure_index(cell_id)
 		return index
 
-	def increase_access_counter(self, index_or_id):
-		counter = self.access_counter.cell_at(index_or_id)
-		counter += 1
-		self.access_counter.set_cell(index_or_id, counter)
-
-	def _show_one_counter(self, cell_id, value):
-		self.drawing_manager.delete_text(cell_id)
-		counter = str(value)
-		self.drawing_manager.draw_text(cell_id, {'C':counter})
-
 	def show_access_counters(self):
-		self.access_counter.foreach(self._show_one_counter)
+		"""Show how many times agent has left each cell, as a heatmap with the count on every cell.
+		Colors are on a log scale, from white(never visited) to red(most visited)"""
+		counts = self.visit_counts.cell_counts(self.grid.n_cells)
+		heat = np.log1p(counts) / max(np.log1p(counts.max()), 1)
+		for cell_id, (count, h) in enumerate(zip(counts.tolist(), heat.tolist())):
+			fade = int(255 * (1 - h))
+			self.drawing_manager.draw_heat(cell_id, '#ff{0:02x}{0:02x}'.format(fade))
+			self.drawing_manager.draw_text(cell_id, {'C':str(count)})
+		self._forget_shown_text()
+
+	def hide_access_counters(self):
+		self.drawing_manager.delete_heat()
+		for cell_id in range(self.grid.n_cells):
+			self.drawing_manager.delete_text(cell_id)
+		self._forget_shown_text()
+
+	def record_experience(self, state, action, reward, state_next, terminal=False):
+		self.history.add(state, self._action_index[action], reward, state_next, terminal)
 
-		#for cell_id in self.access_counter.n_cells:
-		#	drawing_manager.delete_text(cell_id)
-		#	counter = self.access_counter.cell_at(cell_id)
-		#	counter = str(counter)
-		#	drawing_manager.draw_text(cell_id, {'C':counter})
+	def learn_from_experience(self, rl_algorithm, times=200):
+		states, actions, rewards, states_next, terminals = self.history.sample(times)
 
-	def record_experience(self, state, action, reward, state_next):
-		self.history.add((state, action, reward, state_next))
+		if isinstance(self.history, PrioritizedReplayBuffer) == False:
+			rl_algorithm.learn_batch(states, actions, rewards, states_next, terminals)
+			return
 
-	def learn_from_experience(self, rl_algorithm, times=200):
-		experience = self.history.random_choice(times)
-		for s, a, r, s_ in experience:
-			rl_algorithm.one_step(s, a, r, s_)
+		# weight updates to correct the sampling bias, and re-prioritize by the new TD errors
+		td_errors = rl_algorithm.learn_batch(states, actions, rewards, states_next, terminals, self.history.importance_weights)
+		self.history.update_priorities(self.history.last_indexes, td_errors)
 
 	def pretrain(self):
-		self.agent.show = False
+		show = self.show
+		self.show = False
 		
 		while self.history.is_full == False:
 			self.reset()
@@ -288,15 +372,27 @@ class Env():
 			while is_terminal == False:
 				reward, state_next, is_terminal = self.step(action)
 				# record experience
-				self.record_experience(state, action, reward, state_next)
+				self.record_experience(state, action, reward, state_next, is_terminal)
 
 				state = state_next
 				action = self.action_space.random_sample()
 				
-		self.agent.show = True
+		self.show = show
 		self.reset()
 
-	def train(self, rl_algorithm, n_episodes, delay_per_step=0):
+	def train(self, rl_algorithm, n_episodes, delay_per_step=0, verbose=True, trajectory_log=None, profiler=None, hooks=None,
+			curve=None, stop_criteria=None):
+		"""Train 'rl_algorithm' for at most 'n_episodes' episodes.
+		parameters:
+			trajectory_log:  a 'trajectory_log.TrajectoryWriter' that every transition is written to
+			profiler:  a 'profiling.PhaseProfiler' that times each phase of the loop
+			hooks:  list of objects whose 'on_step()' and 'on_episode_end()' methods(see 'profiling.TrainingHooks')
+					are called after every step and episode
+			curve:  a 'metrics.LearningCurve' that return, length and max |TD error| of each episode are added to
+			stop_criteria:  list of 'metrics.StopCriterion', training ends after the first episode that one of them
+					says to stop at, it is kept in 'self.stopped_by'
+		return:
+			(returns, lengths), lists of total reward and number of steps of each episode"""
 		assert rl_algorithm != None
 		assert n_episodes > 0
 
@@ -310,60 +406,151 @@ class Env():
 		#		preset_states.append((state, obj.value, obj.terminal))
 
 		# notify rl_algorithm environment layout and query rl_algorithm to show some info
-		rl_algorithm.layout(1, self.action_space, preset_states)
+		rl_algorithm.layout(1, self.action_space, preset_states, self.n_states)
 
 		#for cell_id in range(self.grid.n_cells):
 		#	self._show_action_values(cell_id, rl_algorithm)
 
-		#rl_algorithm.delayed_learning = True
-		for episode in range(n_episodes):
-			# reset agent's location at beginning of each episode
-			self.reset()
-			time.sleep(delay_per_step)
-
-			if episode % 200 == 0:
-				print("training episode {}".format(episode))
-
-			if episode % 10 == 0:
-				rl_algorithm.delayed_learning_catchup()
-
-			state = self.calc_state()
-			action = rl_algorithm.episode_start(episode, state)
-
-			end = False
-			while end == False:
-				# tell environment what action to move
-				reward, state_next, end = self.step(action)
-				time.sleep(delay_per_step)
-
-				# notify rl_algorithm this step
-				action = rl_algorithm.one_step(state, action, reward, state_next)
-
-				# wk_debug
-				#if reward > 0:
-					#print("reward: {}, state: {}, end is {}".format(reward, state, end))
-
-				# wk_debug
-				#if reward > 0:
-				#	action = rl_algorithm.one_step(state, action, reward, state_next)
-				#else:
-				#	action = rl_algorithm.next_action(state_next)
-
-				# record this step as experience for later learning
-				#self.record_experience(state, action, reward, state_next)
-
-				# display value for each action
-				if self.show:
-					self._show_all_action_values(state, rl_algorithm)
-
-				state = state_next
-
-			rl_algorithm.episode_end()
-
-			# learn from experience
-			#self.learn_from_experience(rl_algorithm)
+		returns = []
+		lengths = []
+
+		# criteria look at the learning curve, keep one even if caller doesn't want it
+		stop_criteria = list(stop_criteria) if stop_criteria != None else []
+		if curve == None and (stop_criteria or verbose):
+			curve = LearningCurve()
+		for criterion in stop_criteria:
+			criterion.reset()
+		self.stopped_by = None
+
+		hooks = list(hooks) if hooks != None else []
+		step_hooks = [hook.on_step for hook in hooks if hasattr(hook, 'on_step')]
+		episode_hooks = [hook.on_episode_end for hook in hooks if hasattr(hook, 'on_episode_end')]
+
+		# the profiler counts action selection on its own, also when it happens inside 'one_step()'
+		profiling = profiler != None
+		if profiling:
+			episode_hooks.append(profiler.on_episode_end)
+			action_selection = getattr(rl_algorithm, 'action_selection', None)
+			if action_selection != None:
+				rl_algorithm.action_selection = profiler.timed('select', action_selection)
+
+		try:
+			#rl_algorithm.delayed_learning = True
+			for episode in range(n_episodes):
+				# reset agent's location at beginning of each episode
+				if profiling: started = profiler.start()
+				self.reset()
+				if profiling: profiler.stop('reset', started)
+				if delay_per_step > 0:
+					if profiling: started = profiler.start()
+					time.sleep(delay_per_step)
+					if profiling: profiler.stop('sleep', started)
+
+				if verbose and episode % 200 == 0:
+					if episode == 0:
+						print("training episode {}".format(episode))
+					else:
+						stats = curve.stats(200)
+						print("training episode {}, last 200 episodes: mean return {:.1f}, mean length {:.1f}, max |delta| {:.3g}".format(
+								episode, stats['mean_return'], stats['mean_length'], stats['max_delta']))
+
+				if episode % 10 == 0:
+					if profiling: started = profiler.start()
+					rl_algorithm.delayed_learning_catchup()
+					if profiling: profiler.stop('catchup', started)
+
+				# nobody collects changed states while hidden
+				if self.show == False and getattr(rl_algorithm, 'track_changes', False):
+					rl_algorithm.track_changes = False
+
+				state = self.calc_state()
+				if profiling: started = profiler.start()
+				action = rl_algorithm.episode_start(episode, state)
+				if profiling: profiler.stop('learn', started)
+				if trajectory_log != None:
+					trajectory_log.episode_start()
+
+				episode_return = 0
+				episode_steps = 0
+
+				end = False
+				while end == False:
+					# tell environment what action to move
+					if profiling: started = profiler.start()
+					reward, state_next, end = self.step(action)
+					if profiling: profiler.stop('step', started)
+					if delay_per_step > 0:
+						if profiling: started = profiler.start()
+						time.sleep(delay_per_step)
+						if profiling: profiler.stop('sleep', started)
+
+					episode_return += reward
+					episode_steps += 1
+
+					if trajectory_log != None:
+						if profiling: started = profiler.start()
+						trajectory_log.add(state, self._action_index[action], reward, state_next, end)
+						if profiling: profiler.stop('log', started)
+
+					# notify rl_algorithm this step
+					if profiling: started = profiler.start()
+					action_taken = action
+					action = rl_algorithm.one_step(state, action, reward, state_next)
+					if profiling: profiler.stop('learn', started)
+
+					# wk_debug
+					#if reward > 0:
+						#print("reward: {}, state: {}, end is {}".format(reward, state, end))
+
+					# wk_debug
+					#if reward > 0:
+					#	action = rl_algorithm.one_step(state, action, reward, state_next)
+					#else:
+					#	action = rl_algorithm.next_action(state_next)
+
+					# record this step as experience for later learning
+					#self.record_experience(state, action, reward, state_next, end)
+
+					# display value for each action
+					if self.show:
+						if profiling: started = profiler.start()
+						self._show_changed_action_values(state, rl_algorithm)
+						if profiling: profiler.stop('render', started)
+
+					if step_hooks:
+						if profiling: started = profiler.start()
+						for on_step in step_hooks:
+							on_step(self, state, action_taken, reward, state_next, end)
+						if profiling: profiler.stop('hooks', started)
+
+					state = state_next
+
+				rl_algorithm.episode_end()
+				returns.append(episode_return)
+				lengths.append(episode_steps)
+
+				for on_episode_end in episode_hooks:
+					on_episode_end(self, episode, episode_return, episode_steps)
+
+				if curve != None:
+					curve.add(episode_return, episode_steps, getattr(rl_algorithm, 'episode_max_delta', np.nan))
+					for criterion in stop_criteria:
+						if criterion.should_stop(rl_algorithm, curve):
+							self.stopped_by = criterion
+							break
+					if self.stopped_by != None:
+						if verbose:
+							print("training stopped after episode {} by {}".format(episode, type(self.stopped_by).__name__))
+						break
+
+				# learn from experience
+				#self.learn_from_experience(rl_algorithm)
+		finally:
+			if profiling and action_selection != None:
+				rl_algorithm.action_selection = action_selection
 
 		rl_algorithm.delayed_learning = False
+		return (returns, lengths)
 
 
 	def test(self, rl_algorithm, repeat=True, delay_per_step=0.5, only_exploitation=True):
@@ -386,7 +573,8 @@ class Env():
 
 			is_terminal = False
 			while is_terminal == False:
-				self._show_all_action_values(state_next, rl_algorithm)
+				if self.show:
+					self._show_changed_action_values(state_next, rl_algorithm)
 				action = query_function(state_next)
 				reward, state_next, is_terminal = self.step(action)
 				time.sleep(delay_per_step)
@@ -409,23 +597,38 @@ class Env():
 		# create an object and attach it to grid
 		obj = GridObject(obj_type, index_or_id, reward, value, terminal, pickable, drawing_manager=self.drawing_manager)
 		self.grid.set_cell(index_or_id, obj)
+		if pickable == True:
+			self.encoder.add_pickable(self.grid.insure_id(index_or_id))
+		self._layout_changed()
 		if self.show:
 			obj.draw()  # draw object
+			self._forget_shown_text(index_or_id)
 
 		return obj
 
 	def restore_object(self, obj):
 		# attach object to cell and draw
+		obj.drawing_manager = self.drawing_manager
 		self.grid.set_cell(obj.index_or_id, obj)
 		if self.show:
 			obj.draw()  # draw object
+			self._forget_shown_text(obj.index_or_id)
 
 	def remove_object(self, index_or_id):
+		obj = self._detach_object(index_or_id)
+		if obj != None:
+			self._layout_changed()
+
+		return obj
+
+	def _detach_object(self, index_or_id):
+		"""Take an object off its cell without changing the layout, e.g. when agent picks it up"""
 		obj = self.object_at(index_or_id)
 		if obj != None:
 			self.grid.set_cell(index_or_id, None)
 			if self.show:
 				obj.remove()
+				self._forget_shown_text(index_or_id)
 
 		return obj
 
@@ -437,81 +640,122 @@ class Env():
 			wall = self.grid.insure_index(wall)
 			if self._is_hit_wall(wall) == False:
 				self.walls.append(wall)
+				self._wall_set.add(wall)
+		self._layout_changed()
 
 	def _is_hit_wall(self, index_or_id):
 		cell_index = self.grid.insure_index(index_or_id)
-		for wall in self.walls:
-			if cell_index == wall:
-				return True
-		return False
+		return cell_index in self._wall_set
 
 	def _show_action_values(self, state, rl_algorithm):
 		assert rl_algorithm != None
 
-		index = self.index_from_state(state)
-		action_values_dict = rl_algorithm.get_action_values_dict(state)
-		if action_values_dict == None:
+		cell_id, mask = self.encoder.decode(state)
+		values = rl_algorithm.get_action_values(state)
+		if values is None:
 			return
 
-		for action, value in action_values_dict.items():
-			action_values_dict[action] = str(int(value))
-		self.drawing_manager.draw_text(index, action_values_dict)
-		
+		# only draw if the text on this cell would change
+		texts = {action:str(int(value)) for action, value in zip(rl_algorithm.action_space.action_list, values.tolist())}
+		if self._shown_text.get(cell_id) != texts:
+			self._shown_text[cell_id] = texts
+			self.drawing_manager.draw_text(cell_id, texts)
+
 	def _show_all_action_values(self, state, rl_algorithm):
-		factor = self.grid.n_cells
-		state_base = state // factor
-		state_base *= factor
+		# show values of every cell for the same set of picked up objects
+		cell_id, mask = self.encoder.decode(state)
+		self._shown_mask = mask
+		self._stale_cells = set()
+		for i in range(self.grid.n_cells):
+			self._show_action_values(self.encoder.encode(i, mask), rl_algorithm)
+
+	def _show_changed_action_values(self, state, rl_algorithm):
+		"""Like '_show_all_action_values()', but only look at states that rl_algorithm changed since last time"""
+		pop_changed_states = getattr(rl_algorithm, 'pop_changed_states', None)
+		changed = pop_changed_states() if pop_changed_states != None else None
+
+		cell_id, mask = self.encoder.decode(state)
+		if changed == None or mask != self._shown_mask:
+			self._show_all_action_values(state, rl_algorithm)
+			return
 
-		for i in range(factor):
-			self._show_action_values(state_base+i, rl_algorithm)
+		for changed_state in changed:
+			changed_cell_id, changed_mask = self.encoder.decode(changed_state)
+			if changed_mask == mask:
+				self._show_action_values(changed_state, rl_algorithm)
 
-	def _move_by_orders(self, from_index, actions):
-		move = {"N":(-1, 0), "S":(1, 0), "W":(0, -1), "E":(0, 1)}
-		destination = np.array(from_index)
-		index_next = np.array(from_index)
+		stale_cells, self._stale_cells = self._stale_cells, set()
+		for stale_cell_id in stale_cells:
+			self._show_action_values(self.encoder.encode(stale_cell_id, mask), rl_algorithm)
 
+	def _forget_shown_text(self, index_or_id=None):
+		"""Text on a cell(all cells if None) was drawn or deleted by something else, show values again"""
+		if index_or_id == None:
+			self._shown_text = {}
+			self._shown_mask = None
+		else:
+			cell_id = self.grid.insure_id(index_or_id)
+			self._shown_text.pop(cell_id, None)
+			self._stale_cells.add(cell_id)
+
+	@property
+	def compiled_layout(self):
+		"""Layout tables used by 'step()', rebuilt after the layout has been changed"""
+		if self._compiled_layout == None:
+			self._compiled_layout = CompiledLayout(self)
+		return self._compiled_layout
+
+	def _layout_changed(self):
+		self._compiled_layout = None
+
+	def _next_cell(self, tables, cell_id, actions):
 		if isinstance(actions, (list, tuple)) == False:
-			actions = [actions]
-			
+			return tables.next_cell_list[cell_id][self._action_index[actions]]
+
+		# move by orders, stop at the first wall
 		for action in actions:
-			index_next += np.array(move[action])
-			if self._is_hit_wall((int(index_next[0]), int(index_next[1]))) == True:
+			cell_id_next = tables.next_cell_list[cell_id][self._action_index[action]]
+			if cell_id_next == cell_id:
 				break
-			else:
-				destination += np.array(move[action])
-
-		return (int(destination[0]), int(destination[1]))
+			cell_id = cell_id_next
+		return cell_id
 
 	def step(self, action):
-		cur_index = self.agent.at
-		next_index = self._move_by_orders(cur_index, action)
+		tables = self.compiled_layout
+		mask = self.picked_mask
 
-		self.increase_access_counter(cur_index)
+		cur_id = self.grid.insure_id(self.agent.at)
+		next_id = self._next_cell(tables, cur_id, action)
 
-		self.agent.one_step_to(next_index, action, self.show)
+		facing = action[-1] if isinstance(action, (list, tuple)) else action
+		self.visit_counts.record(cur_id + tables.n_cells * mask, self._action_index[facing])
 
-		obj = self.object_at(cur_index)
-		if obj != None:
-			reward = obj.reward
+		self.agent.one_step_to(tables.index_of[next_id], facing, self.show)
+
+		# objects that have been picked up in this episode are not on their cells
+		if tables.has_object_list[cur_id] and (mask & tables.pickable_bit_list[cur_id]) == 0:
+			reward = tables.object_reward_list[cur_id]
 		else:
 			reward = self.default_rewards
 
-		obj = self.object_at(next_index)
-		if obj != None:
-			terminal = obj.terminal
-			# if this object is pickable, let agent pick it up
-			if obj.pickable == True:
-				self.agent.pickup(obj)
-				self.remove_object(next_index)
-		else:
-			terminal = False
+		terminal = False
+		if tables.has_object_list[next_id]:
+			bit = tables.pickable_bit_list[next_id]
+			if (mask & bit) == 0:
+				terminal = tables.terminal_list[next_id]
+				# if this object is pickable, let agent pick it up
+				if bit != 0:
+					self.agent.pickup(self.object_at(next_id))
+					self.picked_mask |= bit
+					self._detach_object(next_id)
 
 		# notice: calculate state only after agent move a step and (possibly)pick up object
-		state_next = self.calc_state()
+		state_next = self.encoder.encode(next_id, self.picked_mask)
 
 		if terminal == True:
 			reward += self.agent.credit
 			bag_of_objects = self.agent.drop()
+			self.picked_mask = 0
 			for obj in bag_of_objects:
 				self.restore_object(obj)
 
@@ -526,57 +770,13 @@ if __name__ == '__main__':
 	sys.path.append('./algorithm')
 	from q_learning import QLearning
 	from sarsa import Sarsa
+	from layouts import layout4
+	from metrics import PolicyStable
+	from random_stream import RandomStream
 
 	# set the environment
 	env = Env((8, 8), (130, 90), default_rewards=0)
 
-	def layout0(env):
-		star_credit = 1
-		env.add_object('yellow_star', (3, 3), reward=star_credit, pickable=True)
-		env.add_object('yellow_star', (7, 1), reward=star_credit, pickable=True)
-		env.add_object('yellow_star', (0, 7), reward=star_credit, pickable=True)
-		env.add_object('yellow_star', (5, 7), reward=star_credit, pickable=True)
-		env.add_object('yellow_star', (6, 6), reward=star_credit, pickable=True)
-		env.add_object('yellow_star', (5, 5), reward=star_credit, pickable=True)
-		env.add_object('yellow_star', (4, 6), reward=star_credit, pickable=True)
-		env.add_object('red_ball', (5, 6), value=0, terminal=True).label = "Exit"
-
-	def layout1(env):
-		env.add_object('yellow_star', (3, 3), reward=100, pickable=True).label = "(100)"
-		env.add_object('yellow_star', (0, 7), reward=1000, pickable=True).label = "(1000)"
-		env.add_object('red_ball', (5, 6), value=0, terminal=True).label = "Exit"
-		
-	def layout2(env):
-		env.agent.born_at = (3, 3)
-		env.add_object('yellow_star', (0, 0), reward=100, pickable=True).label = "(100)"
-		env.add_object('yellow_star', (0, 7), reward=100, pickable=True).label = "(100)"
-		env.add_object('yellow_star', (7, 0), reward=100, pickable=True).label = "(100)"
-		env.add_object('yellow_star', (7, 7), reward=100, pickable=True).label = "(100)"
-		env.add_object('red_ball', (3, 4), value=0, terminal=True).label = "Exit"
-		
-	def layout3(env):
-		env.agent.born_at = (0, 0)
-		env.agent.credit = 100
-		env.add_object('red_ball', (3, 4), value=0, terminal=True).label = "Exit"
-
-	def layout4(env):
-		env.agent.born_at = (7, 0)
-		env.add_object('yellow_star', (0, 0), reward=100, pickable=True).label = "(100)"
-		env.add_object('yellow_star', (1, 1), reward=100, pickable=True).label = "(100)"
-		env.add_object('yellow_star', (2, 2), reward=100, pickable=True).label = "(100)"
-		env.add_object('yellow_star', (3, 3), reward=100, pickable=True).label = "(100)"
-		env.add_object('yellow_star', (4, 4), reward=100, pickable=True).label = "(100)"
-		env.add_object('yellow_star', (5, 5), reward=100, pickable=True).label = "(100)"
-		env.add_object('yellow_star', (6, 6), reward=100, pickable=True).label = "(100)"
-		env.add_object('yellow_star', (7, 7), reward=100, pickable=True).label = "(100)"
-		env.add_object('red_ball', (0, 7), value=0, terminal=True).label = "Exit"
-		
-	def layout5(env):
-		env.agent.born_at = (5, 0)
-		env.add_object('yellow_star', (0, 0), pickable=True)
-		env.add_object('yellow_star', (7, 7), pickable=True)
-		env.add_object('red_ball', (4, 3), terminal=True).label = "Exit"
-		
 	# use a layout
 	layout4(env)
 
@@ -587,12 +787,20 @@ if __name__ == '__main__':
 	lambda_ = 0.7
 	n_episodes = 10000
 
-	rl_algorithm = QLearning(alpha, gamma, epsilon)
-	#rl_algorithm = Sarsa(alpha, gamma, lambda_, epsilon)
-
-	env.show = False
-	print("training ...")
-	env.train(rl_algorithm, n_episodes, delay_per_step=0)
+	# own random stream, so loading a checkpoint doesn't rewind the environment's
+	rl_algorithm = QLearning(alpha, gamma, epsilon, rng=RandomStream())
+	#rl_algorithm = Sarsa(alpha, gamma, lambda_, epsilon, rng=RandomStream())
+
+	# reuse what was learned last time, delete the directory to train from scratch
+	checkpoint = 'layout4_checkpoint'
+	if os.path.isdir(checkpoint):
+		print("loading", checkpoint)
+		rl_algorithm.load(checkpoint)
+	else:
+		env.show = False
+		print("training ...")
+		env.train(rl_algorithm, n_episodes, delay_per_step=0, stop_criteria=[PolicyStable(k=10, every=100)])
+		rl_algorithm.save(checkpoint)
 	env.show = True
 
 	#env.show_access_counters()
@@ -0,0 +1,135 @@
+"""Hogwild style parallel training: several worker processes run their own headless environments
+and all update one dense q-table that lives in shared memory, without any locking.
+Lost updates from races are rare on a large table and cost much less than locks would.
+
+The main process can read a snapshot of the table and the aggregate number of steps at any time."""
+import numpy as np
+import multiprocessing
+import sys
+import time
+from multiprocessing import shared_memory
+
+sys.path.append('./algorithm')
+from grid_env import Env
+from layouts import layouts
+from action_values import DenseActionValues
+from random_stream import RandomStream
+from experiment import run_defaults, make_algorithm
+
+def _worker(worker_id, config, table_name, shape, counters_name, n_workers, n_episodes, seed_sequence, episodes_per_report):
+	# worker processes share the resource tracker of the main process, which owns the blocks
+	table_shm = shared_memory.SharedMemory(name=table_name)
+	counters_shm = shared_memory.SharedMemory(name=counters_name)
+	try:
+		# row 0 is steps, row 1 is episodes, one column per worker so nobody writes the same slot
+		counters = np.ndarray((2, n_workers), dtype=np.int64, buffer=counters_shm.buf)
+		qtable = DenseActionValues(shape[0], shape[1], array=np.ndarray(shape, dtype=np.float32, buffer=table_shm.buf))
+
+		env_rng, algorithm_rng = RandomStream(seed_sequence).spawn(2)
+		env = Env(tuple(config['grid_dimension']), default_rewards=config['default_rewards'], headless=True, rng=env_rng)
+		layouts[config['layout']](env)
+
+		rl_algorithm = make_algorithm(config, algorithm_rng)
+		rl_algorithm.attach_table(qtable)
+
+		done = 0
+		while done < n_episodes:
+			n = min(episodes_per_report, n_episodes - done)
+			returns, lengths = env.train(rl_algorithm, n, verbose=False)
+			done += n
+			counters[0, worker_id] += sum(lengths)
+			counters[1, worker_id] += n
+	finally:
+		table_shm.close()
+		counters_shm.close()
+
+
+class HogwildTrainer():
+	def __init__(self, config, n_workers=None, seed=None):
+		"""
+		parameters
+			config:  a run config like those of 'experiment.expand_grid()', must give 'layout',
+					 missing values are taken from 'experiment.run_defaults'
+			n_workers:  number of worker processes, all cores if None
+		"""
+		self.config = dict(run_defaults)
+		self.config.update(config)
+		self.n_workers = n_workers if n_workers != None else multiprocessing.cpu_count()
+		self.seed = seed
+
+		# the layout decides the size of the table
+		env = Env(tuple(self.config['grid_dimension']), headless=True)
+		layouts[self.config['layout']](env)
+		self.shape = (env.n_states, env.action_space.n_actions)
+
+		self._table_shm = shared_memory.SharedMemory(create=True, size=int(np.prod(self.shape)) * 4)
+		self._counters_shm = shared_memory.SharedMemory(create=True, size=2 * self.n_workers * 8)
+		self.table = np.ndarray(self.shape, dtype=np.float32, buffer=self._table_shm.buf)
+		self.counters = np.ndarray((2, self.n_workers), dtype=np.int64, buffer=self._counters_shm.buf)
+		self.table[:] = 0
+		self.counters[:] = 0
+
+		self.processes = []
+		self.start_time = None
+
+	def start(self, n_episodes, episodes_per_report=10):
+		"""Start workers, each of them trains 'n_episodes' episodes"""
+		seeds = np.random.SeedSequence(self.seed).spawn(self.n_workers)
+		self.start_time = time.time()
+		for i in range(self.n_workers):
+			process = multiprocessing.Process(target=_worker,
+					args=(i, self.config, self._table_shm.name, self.shape, self._counters_shm.name,
+						self.n_workers, n_episodes, seeds[i], episodes_per_report))
+			process.start()
+			self.processes.append(process)
+
+	def snapshot(self):
+		"""A copy of the shared q-table, workers may be writing to it while it is copied"""
+		return DenseActionValues(self.shape[0], self.shape[1], array=self.table.copy())
+
+	@property
+	def total_steps(self):
+		return int(self.counters[0].sum())
+
+	@property
+	def total_episodes(self):
+		return int(self.counters[1].sum())
+
+	@property
+	def steps_per_sec(self):
+		if self.start_time == None:
+			return 0.0
+		return self.total_steps / (time.time() - self.start_time)
+
+	def is_alive(self):
+		return any(process.is_alive() for process in self.processes)
+
+	def join(self):
+		for process in self.processes:
+			process.join()
+		self.processes = []
+
+	def close(self):
+		"""Stop using shared memory, call 'snapshot()' first to keep the q-table"""
+		self.join()
+		self.table = None
+		self.counters = None
+		self._table_shm.close()
+		self._table_shm.unlink()
+		self._counters_shm.close()
+		self._counters_shm.unlink()
+
+
+if __name__ == '__main__':
+	trainer = HogwildTrainer({'layout': 'layout4', 'alpha': 0.1, 'gamma': 0.9, 'epsilon': 0.7}, seed=0)
+	print("{} workers, q-table of shape {}".format(trainer.n_workers, trainer.shape))
+
+	trainer.start(500)
+	while trainer.is_alive():
+		time.sleep(1)
+		print("{} episodes, {:.0f} steps/sec".format(trainer.total_episodes, trainer.steps_per_sec))
+	trainer.join()
+
+	qtable = trainer.snapshot()
+	trainer.close()
+	print("max action-value:", qtable.array.max())
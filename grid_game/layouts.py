@@ -0,0 +1,74 @@
+"""Layouts for the grid environment(all but 'corridors' are for an 8x8 grid), each function adds objects to an 'Env' and sets up its agent"""
+import numpy as np
+
+def layout0(env):
+	star_credit = 1
+	env.add_object('yellow_star', (3, 3), reward=star_credit, pickable=True)
+	env.add_object('yellow_star', (7, 1), reward=star_credit, pickable=True)
+	env.add_object('yellow_star', (0, 7), reward=star_credit, pickable=True)
+	env.add_object('yellow_star', (5, 7), reward=star_credit, pickable=True)
+	env.add_object('yellow_star', (6, 6), reward=star_credit, pickable=True)
+	env.add_object('yellow_star', (5, 5), reward=star_credit, pickable=True)
+	env.add_object('yellow_star', (4, 6), reward=star_credit, pickable=True)
+	env.add_object('red_ball', (5, 6), value=0, terminal=True).label = "Exit"
+
+def layout1(env):
+	env.add_object('yellow_star', (3, 3), reward=100, pickable=True).label = "(100)"
+	env.add_object('yellow_star', (0, 7), reward=1000, pickable=True).label = "(1000)"
+	env.add_object('red_ball', (5, 6), value=0, terminal=True).label = "Exit"
+
+def layout2(env):
+	env.agent.born_at = (3, 3)
+	env.add_object('yellow_star', (0, 0), reward=100, pickable=True).label = "(100)"
+	env.add_object('yellow_star', (0, 7), reward=100, pickable=True).label = "(100)"
+	env.add_object('yellow_star', (7, 0), reward=100, pickable=True).label = "(100)"
+	env.add_object('yellow_star', (7, 7), reward=100, pickable=True).label = "(100)"
+	env.add_object('red_ball', (3, 4), value=0, terminal=True).label = "Exit"
+
+def layout3(env):
+	env.agent.born_at = (0, 0)
+	env.agent.credit = 100
+	env.add_object('red_ball', (3, 4), value=0, terminal=True).label = "Exit"
+
+def layout4(env):
+	env.agent.born_at = (7, 0)
+	env.add_object('yellow_star', (0, 0), reward=100, pickable=True).label = "(100)"
+	env.add_object('yellow_star', (1, 1), reward=100, pickable=True).label = "(100)"
+	env.add_object('yellow_star', (2, 2), reward=100, pickable=True).label = "(100)"
+	env.add_object('yellow_star', (3, 3), reward=100, pickable=True).label = "(100)"
+	env.add_object('yellow_star', (4, 4), reward=100, pickable=True).label = "(100)"
+	env.add_object('yellow_star', (5, 5), reward=100, pickable=True).label = "(100)"
+	env.add_object('yellow_star', (6, 6), reward=100, pickable=True).label = "(100)"
+	env.add_object('yellow_star', (7, 7), reward=100, pickable=True).label = "(100)"
+	env.add_object('red_ball', (0, 7), value=0, terminal=True).label = "Exit"
+
+def layout5(env):
+	env.agent.born_at = (5, 0)
+	env.add_object('yellow_star', (0, 0), pickable=True)
+	env.add_object('yellow_star', (7, 7), pickable=True)
+	env.add_object('red_ball', (4, 3), terminal=True).label = "Exit"
+
+def corridors(env, spacing=4, seed=0):
+	"""A layout for a grid of any size: every 'spacing' columns there is a wall with one random gap,
+	so the agent has to find its way from the top left corner to the exit at the bottom right"""
+	height, width = env.grid.dimension
+	rng = np.random.default_rng(seed)
+
+	walls = []
+	for column in range(spacing, width - 1, spacing):
+		gap = rng.integers(height)
+		walls += [(row, column) for row in range(height) if row != gap]
+	env.set_walls(walls)
+
+	env.agent.born_at = (0, 0)
+	env.agent.credit = 100
+	env.add_object('red_ball', (height - 1, width - 1), terminal=True).label = "Exit"
+
+# layouts by name, e.g. for describing experiments
+layouts = {'layout0': layout0,
+			'layout1': layout1,
+			'layout2': layout2,
+			'layout3': layout3,
+			'layout4': layout4,
+			'layout5': layout5,
+			'corridors': corridors}
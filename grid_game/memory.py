@@ -1,9 +1,15 @@
 from collections import deque
 import numpy as np
+import sys
+
+from sum_tree import SumTree, MinTree
+sys.path.append('./algorithm')
+from random_stream import default_stream
 
 class Memory():
-	def __init__(self, maxlen=1000):
+	def __init__(self, maxlen=1000, rng=None):
 		self._memory = deque(maxlen=maxlen)
+		self.rng = rng if rng != None else default_stream()
 
 	def add(self, record):
 		self._memory.append(record)
@@ -18,7 +24,7 @@ class Memory():
 		replace = False
 		if self.n_records < n:
 			replace = True
-		choices = np.random.choice(range(self.n_records), n, replace=replace)
+		choices = self.rng.generator.choice(self.n_records, n, replace=replace)
 
 		return [alist[i] for i in choices]
 
@@ -31,6 +37,158 @@ class Memory():
 		return self.n_records == self._memory.maxlen
 
 
+class ReplayBuffer():
+	"""A preallocated ring buffer of (state, action, reward, state_next, terminal) transitions.
+	Each field is stored in its own fixed dtype array, so no python object is created per record.
+	Actions are stored as action indexes."""
+
+	def __init__(self, capacity=1000, state_dtype=np.int64, action_dtype=np.int16, reward_dtype=np.float32, rng=None):
+		assert capacity > 0
+
+		self.rng = rng if rng != None else default_stream()
+		self.capacity = capacity
+		self.states = np.zeros(capacity, dtype=state_dtype)
+		self.actions = np.zeros(capacity, dtype=action_dtype)
+		self.rewards = np.zeros(capacity, dtype=reward_dtype)
+		self.states_next = np.zeros(capacity, dtype=state_dtype)
+		self.terminals = np.zeros(capacity, dtype=bool)
+
+		self._next = 0  # where the next record is written
+		self._n_records = 0
+
+		# output arrays of 'sample()', reused between calls of the same batch size
+		self._batch = None
+		self.last_indexes = None
+
+	@property
+	def columns(self):
+		return (self.states, self.actions, self.rewards, self.states_next, self.terminals)
+
+	def add(self, state, action, reward, state_next, terminal=False):
+		i = self._next
+		self.states[i] = state
+		self.actions[i] = action
+		self.rewards[i] = reward
+		self.states_next[i] = state_next
+		self.terminals[i] = terminal
+
+		self._next = (i + 1) % self.capacity
+		if self._n_records < self.capacity:
+			self._n_records += 1
+		return i
+
+	def add_batch(self, states, actions, rewards, states_next, terminals):
+		"""Add many records at once, e.g. one step of a 'VecGridEnv', return where they are stored"""
+		n = len(states)
+		indexes = (self._next + np.arange(n)) % self.capacity
+		if n > self.capacity:
+			# only the last 'capacity' records survive
+			indexes = indexes[-self.capacity:]
+			states, actions, rewards = states[-self.capacity:], actions[-self.capacity:], rewards[-self.capacity:]
+			states_next, terminals = states_next[-self.capacity:], terminals[-self.capacity:]
+
+		for column, values in zip(self.columns, (states, actions, rewards, states_next, terminals)):
+			column[indexes] = values
+
+		self._next = (self._next + n) % self.capacity
+		self._n_records = min(self._n_records + n, self.capacity)
+		return indexes
+
+	def _batch_arrays(self, n):
+		if self._batch is None or len(self._batch[0]) != n:
+			self._batch = tuple(np.empty(n, dtype=column.dtype) for column in self.columns)
+		return self._batch
+
+	def sample_indexes(self, n):
+		return self.rng.integers(self._n_records, n)
+
+	def take(self, indexes):
+		"""Gather records at 'indexes' into the output arrays, which are reused by the next call"""
+		batch = self._batch_arrays(len(indexes))
+		for column, out in zip(self.columns, batch):
+			np.take(column, indexes, out=out)
+		self.last_indexes = indexes
+		return batch
+
+	def sample(self, n):
+		"""Uniform randomly sample 'n' records(with replacement), in O(n).
+		return:
+			(states, actions, rewards, states_next, terminals), arrays that are overwritten by the next call
+		"""
+		assert n > 0
+		assert self._n_records > 0
+
+		return self.take(self.sample_indexes(n))
+
+	@property
+	def n_records(self):
+		return self._n_records
+
+	@property
+	def is_full(self):
+		return self._n_records == self.capacity
+
+class PrioritizedReplayBuffer(ReplayBuffer):
+	"""A replay buffer that samples records in proportion to their priority(|TD error| ^ alpha).
+	Because sampling is biased, 'sample()' also computes importance-sampling weights into
+	'.importance_weights', with exponent 'beta' annealed towards 1 on every call."""
+
+	def __init__(self, capacity=1000, alpha=0.6, beta=0.4, beta_increment=1e-4, epsilon=1e-6, **kwargs):
+		super().__init__(capacity, **kwargs)
+
+		self.alpha = alpha
+		self.beta = beta
+		self.beta_increment = beta_increment
+		self.epsilon = epsilon  # keeps records with zero TD error sampleable
+
+		self.sum_tree = SumTree(capacity)
+		self.min_tree = MinTree(capacity)
+		self.max_priority = 1.0  # new records get the max priority seen so far, so each is replayed at least once
+
+		self.importance_weights = None
+
+	def add(self, state, action, reward, state_next, terminal=False):
+		i = super().add(state, action, reward, state_next, terminal)
+		self._set_priorities(i, self.max_priority ** self.alpha)
+		return i
+
+	def add_batch(self, states, actions, rewards, states_next, terminals):
+		indexes = super().add_batch(states, actions, rewards, states_next, terminals)
+		self._set_priorities(indexes, self.max_priority ** self.alpha)
+		return indexes
+
+	def _set_priorities(self, indexes, priorities):
+		self.sum_tree.update(indexes, priorities)
+		self.min_tree.update(indexes, priorities)
+
+	def sample_indexes(self, n):
+		# stratified: one sample from each of 'n' equal slices of the total priority
+		total = self.sum_tree.total
+		values = (np.arange(n) + self.rng.random_array(n)) * (total / n)
+		indexes = self.sum_tree.find_prefix_sum(values)
+		return np.minimum(indexes, self.n_records - 1)
+
+	def sample(self, n):
+		"""Sample 'n' records in proportion to their priorities, see 'ReplayBuffer.sample()'.
+		The sampled indexes are in '.last_indexes' and their weights in '.importance_weights'"""
+		batch = super().sample(n)
+
+		# w_i = (N * P(i)) ^ -beta, normalized by the largest possible weight
+		total = self.sum_tree.total
+		probabilities = self.sum_tree[self.last_indexes] / total
+		max_weight = (self.n_records * self.min_tree.min / total) ** -self.beta
+		self.importance_weights = (self.n_records * probabilities) ** -self.beta / max_weight
+
+		self.beta = min(1.0, self.beta + self.beta_increment)
+		return batch
+
+	def update_priorities(self, indexes, td_errors):
+		"""Set priorities of sampled records from the TD errors the learner got for them"""
+		priorities = np.abs(td_errors) + self.epsilon
+		self.max_priority = max(self.max_priority, float(priorities.max()))
+		self._set_priorities(indexes, priorities ** self.alpha)
+
+
 if __name__ == "__main__":
 	m = Memory()	
 	for _ in range(100):
@@ -44,3 +202,22 @@ if __name__ == "__main__":
 	m.add(range(1000))
 	print("current records:", m.n_records)
 	print("memory is full?", m.is_full)
+
+	buffer = ReplayBuffer(1000000)
+	n = 250000
+	buffer.add_batch(np.arange(n), np.random.randint(4, size=n), np.zeros(n), np.arange(1, n+1), np.zeros(n, dtype=bool))
+	buffer.add(7, 1, 1.0, 8, True)
+	states, actions, rewards, states_next, terminals = buffer.sample(5)
+	print("sampled states:", states, "actions:", actions)
+	print("current records:", buffer.n_records)
+	print("replay buffer is full?", buffer.is_full)
+
+	prioritized = PrioritizedReplayBuffer(1000)
+	for i in range(1000):
+		prioritized.add(i, 0, 0.0, i+1)
+	prioritized.sample(100)
+	prioritized.update_priorities(prioritized.last_indexes, np.zeros(100))
+	prioritized.update_priorities(np.array([7]), np.array([100.0]))
+	prioritized.sample(10)
+	print("prioritized samples:", prioritized.last_indexes)
+	print("importance weights:", prioritized.importance_weights)
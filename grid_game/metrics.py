@@ -0,0 +1,148 @@
+"""Learning curves and stopping criteria for 'Env.train()'.
+
+A 'LearningCurve' keeps the return, length and max |TD error| of the latest episodes in a ring
+buffer, so statistics over a moving window cost nothing to keep. Stopping criteria look at the curve
+(and at the algorithm) after every episode, training ends as soon as one of them says so:
+	env.train(rl_algorithm, 10000, stop_criteria=[PolicyStable(5), TargetReturn(800)])"""
+import numpy as np
+
+class LearningCurve():
+	def __init__(self, capacity=1000):
+		self.capacity = capacity
+		self.returns = np.zeros(capacity, dtype=np.float64)
+		self.lengths = np.zeros(capacity, dtype=np.int64)
+		self.max_deltas = np.zeros(capacity, dtype=np.float64)
+		self.n_episodes = 0  # episodes added so far, older ones are overwritten
+
+	def add(self, episode_return, episode_length, max_delta=np.nan):
+		i = self.n_episodes % self.capacity
+		self.returns[i] = episode_return
+		self.lengths[i] = episode_length
+		self.max_deltas[i] = max_delta
+		self.n_episodes += 1
+
+	def __len__(self):
+		return min(self.n_episodes, self.capacity)
+
+	def last(self, column, n=None):
+		"""Values of 'column'('returns', 'lengths' or 'max_deltas') of the last 'n' episodes, oldest first"""
+		size = len(self)
+		n = size if n == None else min(n, size)
+		end = self.n_episodes % self.capacity
+		indexes = (np.arange(end - n, end)) % self.capacity
+		return getattr(self, column)[indexes]
+
+	def stats(self, window=100):
+		"""Statistics over the last 'window' episodes"""
+		returns = self.last('returns', window)
+		lengths = self.last('lengths', window)
+		max_deltas = self.last('max_deltas', window)
+		if len(returns) == 0:
+			return {'episodes': 0}
+		return {'episodes': len(returns),
+				'mean_return': float(returns.mean()),
+				'std_return': float(returns.std()),
+				'min_return': float(returns.min()),
+				'max_return': float(returns.max()),
+				'mean_length': float(lengths.mean()),
+				'max_delta': float(np.nanmax(max_deltas)) if np.isfinite(max_deltas).any() else np.nan}
+
+
+class StopCriterion():
+	"""Base class, 'should_stop()' is called after every training episode"""
+
+	def reset(self):
+		pass
+
+	def should_stop(self, rl_algorithm, curve):
+		return False
+
+
+class PolicyStable(StopCriterion):
+	"""Stop when the greedy policy didn't change for 'k' evaluations in a row, evaluated every 'every' episodes"""
+
+	def __init__(self, k=5, every=50):
+		self.k = k
+		self.every = every
+		self.reset()
+
+	def reset(self):
+		self.policy = None
+		self.n_unchanged = 0
+
+	@staticmethod
+	def greedy_policy(qtable):
+		"""Best action index of every state in a q-table, as (states, actions) arrays"""
+		if hasattr(qtable, 'array'):
+			return (None, qtable.array.argmax(axis=1))
+		states = np.array(sorted(qtable.states()), dtype=np.int64)
+		return (states, qtable.rows(states).argmax(axis=1))
+
+	def should_stop(self, rl_algorithm, curve):
+		if curve.n_episodes % self.every != 0:
+			return False
+
+		policy = self.greedy_policy(rl_algorithm.qtable)
+		if self.policy != None and _same_policy(self.policy, policy):
+			self.n_unchanged += 1
+		else:
+			self.n_unchanged = 0
+		self.policy = policy
+		return self.n_unchanged >= self.k
+
+def _same_policy(a, b):
+	states_a, actions_a = a
+	states_b, actions_b = b
+	if (states_a is None) != (states_b is None):
+		return False
+	if states_a is not None and np.array_equal(states_a, states_b) == False:
+		return False
+	return np.array_equal(actions_a, actions_b)
+
+
+class DeltaBelow(StopCriterion):
+	"""Stop when max |TD error| stayed below 'tolerance' in each of the last 'window' episodes.
+	Before any reward has been found all errors are 0, so the window should be long enough to find one"""
+
+	def __init__(self, tolerance, window=10):
+		self.tolerance = tolerance
+		self.window = window
+
+	def should_stop(self, rl_algorithm, curve):
+		if len(curve) < self.window:
+			return False
+		return bool((curve.last('max_deltas', self.window) < self.tolerance).all())
+
+
+class TargetReturn(StopCriterion):
+	"""Stop when the mean return over the last 'window' episodes reached 'target'"""
+
+	def __init__(self, target, window=100):
+		self.target = target
+		self.window = window
+
+	def should_stop(self, rl_algorithm, curve):
+		if len(curve) < self.window:
+			return False
+		return curve.last('returns', self.window).mean() >= self.target
+
+
+if __name__ == '__main__':
+	import sys
+	sys.path.append('./algorithm')
+	from grid_env import Env
+	from layouts import layout4
+	from q_learning import QLearning
+	from common import epsilon_greedy
+
+	env = Env((8, 8), headless=True)
+	layout4(env)
+
+	rl_algorithm = QLearning(0.1, 0.9, 0.7)
+	rl_algorithm.action_selection = lambda steps, values, rng=None: epsilon_greedy(0.9, values, rng)
+
+	curve = LearningCurve()
+	criteria = [PolicyStable(k=5, every=100), TargetReturn(10000, window=50)]
+	returns, lengths = env.train(rl_algorithm, 20000, verbose=False, curve=curve, stop_criteria=criteria)
+	print("stopped after {} episodes by {}".format(len(returns), type(env.stopped_by).__name__))
+	print(curve.stats(100))
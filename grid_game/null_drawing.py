@@ -0,0 +1,61 @@
+"""A drawing backend that draws nothing.
+It has the same interface as 'DrawingManager' but never imports tkinter, so an environment
+can run on machines without a display and without paying for canvas calls"""
+class NullDrawingManager():
+	def wait(self):
+		return self
+
+	def draw_grid(self):
+		pass
+
+	def draw_object(self, obj_type, index_or_id):
+		return None
+
+	def delete_object(self, obj_type, index_or_id):
+		pass
+
+	def is_object_on_cell(self, obj_type, index_or_id):
+		return 0
+
+	def delete_objects_on_cell(self, index_or_id):
+		pass
+
+	def draw_text(self, index_or_id, text_dict):
+		pass
+
+	def delete_text(self, index_or_id):
+		pass
+
+	def draw_text_list(self, index_or_id, text_anchor_list):
+		pass
+
+	def draw_trace(self, index_or_id, angle=0, ratio=0.5):
+		pass
+
+	def delete_trace(self):
+		pass
+
+	def draw_heat(self, index_or_id, color):
+		pass
+
+	def delete_heat(self):
+		pass
+
+	def draw_agent(self, index_or_id, angle=0):
+		pass
+
+	def remove_agent(self):
+		pass
+
+	def rotate_agent(self, index_or_id, rotate_angle):
+		pass
+
+	def move_agent(self, index_or_id, index_or_id_next):
+		pass
+
+
+if __name__ == "__main__":
+	dm = NullDrawingManager().wait()
+	dm.draw_grid()
+	dm.draw_text((1, 1), {'C':'nothing is drawn'})
+	print("object on cell:", dm.is_object_on_cell('red_ball', (1, 1)))
@@ -0,0 +1,144 @@
+"""Solve an environment exactly with dynamic programming instead of sampling episodes.
+
+The dynamics of an 'Env' are deterministic and fully known from its compiled layout, so the whole
+model(next state, reward and terminal flag for every state and action, including every subset of
+picked up objects) is built as arrays and solved with vectorized value iteration or policy iteration.
+The resulting action-values can be handed to a 'TDLearning' so 'Env.test()' can replay the policy."""
+import numpy as np
+import sys
+
+sys.path.append('./algorithm')
+from grid_env import Agent
+from action_values import DenseActionValues
+
+class GridModel():
+	# the full state space has n_cells * 2^n_pickables states, refuse to build anything bigger
+	max_states = 1 << 26
+
+	def __init__(self, env):
+		tables = env.compiled_layout
+		n_cells = tables.n_cells
+		n_masks = 1 << env.encoder.n_pickables
+		self.n_states = n_cells * n_masks
+		self.n_actions = tables.n_actions
+		if self.n_states > self.max_states:
+			raise ValueError("too many states to plan for: {}".format(self.n_states))
+
+		# state = cell + n_cells * mask, so rows of these (n_masks, n_cells) grids flatten to states
+		masks, cells = np.divmod(np.arange(self.n_states), n_cells)
+
+		# reward of leaving a cell, objects that have been picked up are gone
+		bits = tables.pickable_bit[cells]
+		present = tables.has_object[cells] & ((masks & bits) == 0)
+		rewards = np.where(present, tables.object_reward[cells], env.default_rewards)
+
+		# states where agent stands on a terminal object never take actions
+		self.absorbing = present & tables.terminal[cells]
+
+		cells_next = tables.next_cell[cells]  # (n_states, n_actions)
+		masks = masks[:, None]
+		bits = tables.pickable_bit[cells_next]
+		present = tables.has_object[cells_next] & ((masks & bits) == 0)
+		self.terminals = present & tables.terminal[cells_next]
+		masks_next = masks | np.where(present, bits, 0)
+		self.states_next = cells_next + n_cells * masks_next
+
+		# reaching a terminal with a full bag earns the agent's extra credit
+		n_picked = np.zeros(masks_next.shape, dtype=np.int64)
+		for i in range(env.encoder.n_pickables):
+			n_picked += (masks_next >> i) & 1
+		credit = np.where(n_picked >= Agent.full_bag, Agent.full_bag_credit, 0)
+		self.rewards = rewards[:, None] + np.where(self.terminals, credit, 0)
+
+	def backup(self, values, gamma):
+		"""Action-values of all states given state values"""
+		q = self.rewards + gamma * np.where(self.terminals, 0, values[self.states_next])
+		q[self.absorbing] = 0
+		return q
+
+def value_iteration(model, gamma, tolerance=1e-6, max_iterations=100000):
+	"""return:
+		(action_values, n_iterations), iteration stops when no state value changes more than 'tolerance'"""
+	values = np.zeros(model.n_states)
+	for iteration in range(1, max_iterations + 1):
+		q = model.backup(values, gamma)
+		values_new = q.max(axis=1)
+		change = np.abs(values_new - values).max()
+		values = values_new
+		if change < tolerance:
+			break
+	return (model.backup(values, gamma), iteration)
+
+def evaluate_policy(model, policy, gamma, values=None, tolerance=1e-6, max_iterations=100000):
+	"""State values of a deterministic policy(one action index per state), by iterative evaluation"""
+	if values is None:
+		values = np.zeros(model.n_states)
+	states = np.arange(model.n_states)
+	rewards = model.rewards[states, policy]
+	states_next = model.states_next[states, policy]
+	continuing = ~(model.terminals[states, policy] | model.absorbing)
+
+	for _ in range(max_iterations):
+		values_new = np.where(continuing, gamma * values[states_next], 0)
+		values_new += np.where(model.absorbing, 0, rewards)
+		change = np.abs(values_new - values).max()
+		values = values_new
+		if change < tolerance:
+			break
+	return values
+
+def policy_iteration(model, gamma, tolerance=1e-6, max_iterations=1000):
+	"""return:
+		(action_values, n_iterations), iteration stops when the greedy policy doesn't change"""
+	policy = np.zeros(model.n_states, dtype=np.int64)
+	values = None
+	for iteration in range(1, max_iterations + 1):
+		values = evaluate_policy(model, policy, gamma, values, tolerance)
+		q = model.backup(values, gamma)
+
+		# only switch action if it is really better, so ties don't make the policy flip forever
+		current = q[np.arange(model.n_states), policy]
+		policy_new = np.where(q.max(axis=1) > current + tolerance, q.argmax(axis=1), policy)
+		if np.array_equal(policy_new, policy):
+			break
+		policy = policy_new
+	return (q, iteration)
+
+def export_to(action_values, rl_algorithm, env):
+	"""Hand solved action-values to a 'TDLearning' algorithm, e.g. for 'env.test(rl_algorithm)'"""
+	n_states, n_actions = action_values.shape
+	qtable = DenseActionValues(n_states, n_actions, array=action_values.astype(np.float32))
+	rl_algorithm.attach_table(qtable)
+	rl_algorithm.layout(1, env.action_space, [], env.n_states)
+
+
+if __name__ == '__main__':
+	import time
+	from grid_env import Env
+	from q_learning import QLearning
+	from layouts import layout4
+
+	env = Env((8, 8), headless=True)
+	layout4(env)
+
+	start = time.time()
+	model = GridModel(env)
+	q, iterations = value_iteration(model, 0.9)
+	print("value iteration: {} states, {} iterations, {:.3f} seconds".format(model.n_states, iterations, time.time() - start))
+
+	start = time.time()
+	q_pi, iterations = policy_iteration(model, 0.9)
+	print("policy iteration: {} iterations, {:.3f} seconds".format(iterations, time.time() - start))
+
+	rl_algorithm = QLearning(0.1, 0.9, 0.7)
+	export_to(q, rl_algorithm, env)
+
+	# follow the greedy policy once
+	env.reset()
+	state = env.calc_state()
+	total, steps, end = 0, 0, False
+	while end == False and steps < 1000:
+		reward, state, end = env.step(rl_algorithm.best_action(state))
+		total += reward
+		steps += 1
+	print("greedy episode: {} steps, return {}".format(steps, total))
@@ -0,0 +1,113 @@
+"""Instrumentation for 'Env.train()': where does the training time go.
+
+A 'PhaseProfiler' passed to 'Env.train(profiler=...)' times each phase of the training loop
+(stepping the environment, learning, selecting actions, rendering, sleeping, catching up delayed
+learning...) and keeps a cumulative and a per-episode breakdown. It costs a couple of clock reads per
+phase, and nothing at all when no profiler is given.
+
+Hooks passed to 'Env.train(hooks=[...])' are objects with 'on_step()' and/or 'on_episode_end()'
+methods, 'TrainingHooks' is a base class with both as no-ops."""
+import time
+
+class TrainingHooks():
+	def on_step(self, env, state, action, reward, state_next, end):
+		"""Called after every step, once rl_algorithm has learned from it"""
+		pass
+
+	def on_episode_end(self, env, episode, episode_return, episode_steps):
+		pass
+
+
+class PhaseProfiler(TrainingHooks):
+	phases = ('reset', 'step', 'learn', 'select', 'render', 'sleep', 'catchup', 'log', 'hooks')
+
+	def __init__(self, clock=time.perf_counter):
+		self.clock = clock
+		self.seconds = {phase:0.0 for phase in self.phases}
+		self.calls = {phase:0 for phase in self.phases}
+
+		# time of phases timed inside other phases(e.g. 'select' inside 'learn'), so outer phases
+		# only count their own time
+		self._inner = 0.0
+
+		# one row per episode: (episode, steps, seconds per phase in the order of 'phases')
+		self.episodes = []
+		self._episode_start = dict(self.seconds)
+
+	def start(self):
+		return (self.clock(), self._inner)
+
+	def stop(self, phase, started):
+		"""Add the time since 'started'(from 'start()') to 'phase', minus phases timed in between"""
+		t, inner = started
+		elapsed = self.clock() - t - (self._inner - inner)
+		self.seconds[phase] += elapsed
+		self.calls[phase] += 1
+		self._inner += elapsed
+
+	def timed(self, phase, function):
+		"""Wrap 'function' so every call of it is counted in 'phase'"""
+		def wrapper(*args, **kwargs):
+			started = self.start()
+			result = function(*args, **kwargs)
+			self.stop(phase, started)
+			return result
+		return wrapper
+
+	def on_episode_end(self, env, episode, episode_return, episode_steps):
+		row = [episode, episode_steps]
+		for phase in self.phases:
+			row.append(self.seconds[phase] - self._episode_start[phase])
+		self.episodes.append(tuple(row))
+		self._episode_start = dict(self.seconds)
+
+	@property
+	def total_seconds(self):
+		return sum(self.seconds.values())
+
+	def episode_breakdown(self, i=-1):
+		"""Seconds per phase of the i-th recorded episode, as a dict"""
+		row = self.episodes[i]
+		return dict(zip(self.phases, row[2:]))
+
+	def report(self):
+		"""Cumulative breakdown as a printable table"""
+		total = self.total_seconds
+		n_steps = sum(row[1] for row in self.episodes)
+		lines = ["{:8s} {:>10s} {:>7s} {:>10s} {:>10s}".format('phase', 'seconds', '%', 'calls', 'us/call')]
+		for phase in self.phases:
+			seconds = self.seconds[phase]
+			calls = self.calls[phase]
+			if calls == 0:
+				continue
+			lines.append("{:8s} {:10.3f} {:7.1f} {:10d} {:10.2f}".format(phase, seconds,
+					100 * seconds / total if total > 0 else 0, calls, 1e6 * seconds / calls))
+		lines.append("{} episodes, {} steps, {:.3f} seconds, {:.0f} steps/s".format(len(self.episodes), n_steps,
+				total, n_steps / total if total > 0 else 0))
+		return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+	import sys
+	sys.path.append('./algorithm')
+	from grid_env import Env
+	from layouts import layout4
+	from q_learning import QLearning
+
+	class RewardProbe(TrainingHooks):
+		def __init__(self):
+			self.n_rewarded = 0
+
+		def on_step(self, env, state, action, reward, state_next, end):
+			if reward > 0:
+				self.n_rewarded += 1
+
+	env = Env((8, 8), headless=True)
+	layout4(env)
+
+	profiler = PhaseProfiler()
+	probe = RewardProbe()
+	env.train(QLearning(0.1, 0.9, 0.7), 20, verbose=False, profiler=profiler, hooks=[probe])
+	print(profiler.report())
+	print("last episode:", {phase:round(seconds, 4) for phase, seconds in profiler.episode_breakdown().items()})
+	print("rewarded steps:", probe.n_rewarded)
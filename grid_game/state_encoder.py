@@ -0,0 +1,64 @@
+"""A class that maps (agent's cell, set of picked up objects) to one dense state number and back.
+
+Every pickable object gets one bit, a set of picked up objects is the bitmask of their bits,
+and the state is 'cell_id + n_cells * mask'. So states are in [0, n_cells * 2^n_pickables)
+and don't depend on the order in which objects are picked up."""
+class StateEncoder():
+	def __init__(self, n_cells):
+		self.n_cells = n_cells
+		self._bits = {}  # cell id of pickable object -> its bit in the mask
+
+	def add_pickable(self, cell_id):
+		"""Assign a bit to a pickable object's cell, return the bit.
+		A cell keeps its bit if a pickable object is added to it again"""
+		bit = self._bits.get(cell_id)
+		if bit is None:
+			bit = 1 << len(self._bits)
+			self._bits[cell_id] = bit
+		return bit
+
+	def bit_of(self, cell_id):
+		"""Return the bit of the pickable object on a cell, or 0 if the cell has none"""
+		return self._bits.get(cell_id, 0)
+
+	@property
+	def pickable_cells(self):
+		"""Cell ids of pickable objects, in the order of their bits"""
+		return list(self._bits.keys())
+
+	@property
+	def n_pickables(self):
+		return len(self._bits)
+
+	@property
+	def n_states(self):
+		return self.n_cells << self.n_pickables
+
+	def encode(self, cell_id, mask=0):
+		return cell_id + self.n_cells * mask
+
+	def decode(self, state):
+		"""Return (cell_id, mask) of a state"""
+		mask, cell_id = divmod(state, self.n_cells)
+		return (cell_id, mask)
+
+	def mask_of_cells(self, cell_ids):
+		mask = 0
+		for cell_id in cell_ids:
+			mask |= self._bits[cell_id]
+		return mask
+
+	def cells_of_mask(self, mask):
+		return [cell_id for cell_id, bit in self._bits.items() if mask & bit]
+
+
+if __name__ == "__main__":
+	encoder = StateEncoder(64)
+	for cell_id in [0, 9, 18]:
+		encoder.add_pickable(cell_id)
+	print("number of states:", encoder.n_states)
+
+	state = encoder.encode(5, encoder.mask_of_cells([18, 0]))
+	print("state:", state)
+	cell_id, mask = encoder.decode(state)
+	print("cell id: {}, picked up: {}".format(cell_id, encoder.cells_of_mask(mask)))
@@ -0,0 +1,80 @@
+"""Binary trees over a fixed number of leaves, stored in one flat array.
+Node i has children 2i and 2i+1, leaves start at 'size', so updating a leaf and querying are O(log n).
+All operations take arrays of leaves so a whole batch is handled level by level."""
+import numpy as np
+
+
+class SegmentTree():
+	def __init__(self, capacity, operation, neutral):
+		assert capacity > 0
+
+		# round up to a power of two so the tree is complete
+		size = 1
+		while size < capacity:
+			size *= 2
+
+		self.capacity = capacity
+		self.size = size
+		self.operation = operation
+		self.neutral = neutral
+		self.tree = np.full(2 * size, neutral, dtype=np.float64)
+
+	def __getitem__(self, leaves):
+		return self.tree[self.size + np.asarray(leaves)]
+
+	def update(self, leaves, values):
+		"""Set values of leaves and recompute their ancestors"""
+		nodes = self.size + np.asarray(leaves).reshape(-1)
+		self.tree[nodes] = values
+
+		# all leaves are on the same level, so go up one level at a time until the root
+		while nodes[0] > 1:
+			nodes = np.unique(nodes // 2)
+			self.tree[nodes] = self.operation(self.tree[2 * nodes], self.tree[2 * nodes + 1])
+
+	@property
+	def root(self):
+		return self.tree[1]
+
+
+class SumTree(SegmentTree):
+	def __init__(self, capacity):
+		super().__init__(capacity, np.add, 0.0)
+
+	@property
+	def total(self):
+		return self.tree[1]
+
+	def find_prefix_sum(self, values):
+		"""For each value v, find the leaf i where sum(leaves[:i]) <= v < sum(leaves[:i+1])"""
+		values = np.array(values, dtype=np.float64)
+		nodes = np.ones(len(values), dtype=np.int64)
+		while nodes[0] < self.size:
+			left = 2 * nodes
+			left_sum = self.tree[left]
+			go_right = values >= left_sum
+			values -= np.where(go_right, left_sum, 0)
+			nodes = left + go_right
+
+		# rounding can push a value past the last used leaf
+		return np.minimum(nodes - self.size, self.capacity - 1)
+
+
+class MinTree(SegmentTree):
+	def __init__(self, capacity):
+		super().__init__(capacity, np.minimum, np.inf)
+
+	@property
+	def min(self):
+		return self.tree[1]
+
+
+if __name__ == "__main__":
+	tree = SumTree(5)
+	tree.update([0, 1, 2, 3, 4], [1, 2, 3, 4, 0])
+	print("total:", tree.total)
+	print("leaves of prefix sums [0, 1, 2.5, 6, 9.9]:", tree.find_prefix_sum([0, 1, 2.5, 6, 9.9]))
+
+	min_tree = MinTree(5)
+	min_tree.update([0, 3], [0.5, 0.25])
+	print("min:", min_tree.min)
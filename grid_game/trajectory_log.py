@@ -0,0 +1,197 @@
+"""Append-only binary log of transitions, so expensive runs(rendered, or driven by a human) can be
+replayed for offline training as many times as wanted.
+
+A log file starts with a magic string and a JSON header(action list, number of states), followed by
+chunks. A chunk is a small fixed header(number of transitions, number of episode starts) and then
+one raw array per column: states, actions(indexes), rewards, states_next, terminals, and the
+positions inside the chunk where episodes start. Chunks are written with one call, so a log that
+was cut short by a crash is still readable up to its last whole chunk."""
+import numpy as np
+import json
+import os
+import struct
+import sys
+
+sys.path.append('./algorithm')
+from alg_plugin import ActionSpace
+
+magic = b'RLTRAJ01'
+chunk_header = struct.Struct('<II')
+columns = [('states', np.int64),
+		('actions', np.int16),
+		('rewards', np.float32),
+		('states_next', np.int64),
+		('terminals', np.bool_)]
+
+def read_header(f):
+	if f.read(len(magic)) != magic:
+		raise ValueError("not a trajectory log")
+	size, = struct.unpack('<I', f.read(4))
+	return json.loads(f.read(size).decode('utf-8'))
+
+
+class TrajectoryWriter():
+	def __init__(self, path, action_list, n_states=None, chunk_size=4096):
+		"""
+		parameters
+			path:  log file, transitions are appended if it already exists
+			action_list:  actions of the environment, transitions store indexes into it
+			n_states:  number of states if known, lets the offline trainer use a dense q-table
+			chunk_size:  number of transitions buffered before a chunk is written
+		"""
+		self.chunk_size = chunk_size
+		self.header = {'action_list': list(action_list), 'n_states': n_states}
+
+		if os.path.exists(path) and os.path.getsize(path) > 0:
+			with open(path, 'rb') as f:
+				header = read_header(f)
+			if header['action_list'] != self.header['action_list']:
+				raise ValueError("log {} has actions {}".format(path, header['action_list']))
+			self.file = open(path, 'ab')
+		else:
+			self.file = open(path, 'wb')
+			data = json.dumps(self.header).encode('utf-8')
+			self.file.write(magic + struct.pack('<I', len(data)) + data)
+
+		self.buffers = [np.zeros(chunk_size, dtype=dtype) for name, dtype in columns]
+		self.episode_starts = []
+		self.n = 0
+
+	def episode_start(self):
+		"""Mark that the next transition is the first of an episode"""
+		self.episode_starts.append(self.n)
+
+	def add(self, state, action_index, reward, state_next, terminal=False):
+		n = self.n
+		for buffer, value in zip(self.buffers, (state, action_index, reward, state_next, terminal)):
+			buffer[n] = value
+		self.n = n + 1
+		if self.n == self.chunk_size:
+			self.flush()
+
+	def flush(self):
+		"""Write buffered transitions as one chunk"""
+		if self.n == 0:
+			return
+
+		# an episode that starts at the end of a chunk, starts at the beginning of the next one
+		starts = [i for i in self.episode_starts if i < self.n]
+		data = [chunk_header.pack(self.n, len(starts))]
+		data += [buffer[:self.n].tobytes() for buffer in self.buffers]
+		data.append(np.array(starts, dtype=np.int32).tobytes())
+		self.file.write(b''.join(data))
+		self.file.flush()
+
+		self.episode_starts = [0] if len(starts) < len(self.episode_starts) else []
+		self.n = 0
+
+	def close(self):
+		self.flush()
+		self.file.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc_info):
+		self.close()
+
+
+def read_chunks(path):
+	"""Generator over the chunks of a log, one chunk in memory at a time.
+	yields:
+		dict of column arrays, plus 'episode_starts'(positions in the chunk) and 'actions_next'
+		(action index taken in 'states_next', -1 where the log doesn't tell)"""
+	with open(path, 'rb') as f:
+		read_header(f)
+
+		pending = None
+		while True:
+			data = f.read(chunk_header.size)
+			if len(data) < chunk_header.size:
+				break
+			n, n_starts = chunk_header.unpack(data)
+
+			chunk = {}
+			for name, dtype in columns:
+				size = n * np.dtype(dtype).itemsize
+				data = f.read(size)
+				if len(data) < size:
+					break
+				chunk[name] = np.frombuffer(data, dtype=dtype)
+			data = f.read(n_starts * 4)
+			if len(chunk) < len(columns) or len(data) < n_starts * 4:
+				break  # cut short
+			chunk['episode_starts'] = np.frombuffer(data, dtype=np.int32)
+
+			# next action is the action of the next transition, if that is in the same episode
+			actions_next = np.full(n, -1, dtype=np.int64)
+			actions_next[:-1] = chunk['actions'][1:]
+			actions_next[chunk['episode_starts'][chunk['episode_starts'] > 0] - 1] = -1
+			actions_next[chunk['terminals']] = -1
+			chunk['actions_next'] = actions_next
+
+			# the last transition of a chunk needs to see the next chunk first
+			if pending != None:
+				if 0 not in chunk['episode_starts'] and pending['terminals'][-1] == False:
+					pending['actions_next'][-1] = chunk['actions'][0]
+				yield pending
+			pending = chunk
+
+		if pending != None:
+			yield pending
+
+def read_transitions(path, batch_size=256):
+	"""Generator over a log in batches of at most 'batch_size' transitions, batches don't cross chunks"""
+	for chunk in read_chunks(path):
+		n = len(chunk['states'])
+		for start in range(0, n, batch_size):
+			yield {name: chunk[name][start:start + batch_size]
+					for name in ('states', 'actions', 'rewards', 'states_next', 'terminals', 'actions_next')}
+
+def train_offline(rl_algorithm, path, n_passes=1, batch_size=256):
+	"""Train a 'TDLearning' on a log without an environment, a batch of transitions at a time.
+	If rl_algorithm has not been laid out, it is laid out from the log header.
+	return:
+		number of transitions learned from"""
+	with open(path, 'rb') as f:
+		header = read_header(f)
+	if rl_algorithm.action_space == None:
+		rl_algorithm.layout(1, ActionSpace(header['action_list'], rng=rl_algorithm.rng), [], header['n_states'])
+	elif rl_algorithm.action_space.action_list != header['action_list']:
+		raise ValueError("log {} has actions {}".format(path, header['action_list']))
+
+	n_learned = 0
+	for _ in range(n_passes):
+		for batch in read_transitions(path, batch_size):
+			actions_next = None
+			if rl_algorithm.next_action_considered == True:
+				# on-policy learning uses the logged next action, or the current policy where there isn't one
+				actions_next = batch['actions_next']
+				unknown = actions_next < 0
+				if unknown.any():
+					actions_next = np.where(unknown, rl_algorithm.next_action_indexes(batch['states_next']), actions_next)
+
+			rl_algorithm.learn_batch(batch['states'], batch['actions'].astype(np.int64), batch['rewards'].astype(np.float64),
+					batch['states_next'], batch['terminals'], actions_next=actions_next)
+			n_learned += len(batch['states'])
+
+	return n_learned
+
+
+if __name__ == '__main__':
+	from grid_env import Env
+	from layouts import layout4
+	from q_learning import QLearning
+
+	env = Env((8, 8), headless=True)
+	layout4(env)
+
+	# record some runs, then learn from them twice without the environment
+	path = 'layout4_trajectories.log'
+	with TrajectoryWriter(path, env.action_space.action_list, env.n_states) as log:
+		returns, lengths = env.train(QLearning(0.1, 0.9, 0.7), 50, verbose=False, trajectory_log=log)
+	print("recorded {} transitions".format(sum(lengths)))
+
+	offline = QLearning(0.1, 0.9, 0.7)
+	print("learned from {} transitions".format(train_offline(offline, path, n_passes=2)))
+	print("max action-value:", offline.qtable.array.max())
@@ -0,0 +1,142 @@
+import numpy as np
+
+from grid_env import Agent
+
+
+class VecGridEnv():
+	"""N independent copies of one 'Env' layout, stepped together with array operations.
+
+	Agent locations, picked-up objects(as bitmasks) and credits of all copies are kept in arrays,
+	one 'step()' call moves every copy and copies that reach a terminal are reset automatically.
+	States are encoded by the environment's 'StateEncoder', so they are the same as 'Env.calc_state()' gives.
+	"""
+
+	def __init__(self, env, n_envs, rng=None):
+		assert n_envs > 0
+
+		# random stream for sampling actions, the environment's if not given
+		self.rng = rng if rng != None else env.rng
+
+		self.n_envs = n_envs
+		self.n_cells = env.grid.n_cells
+		self.action_space = env.action_space
+		self.n_actions = self.action_space.n_actions
+
+		self._compile(env)
+
+		# per copy dynamic state
+		self.cells = np.empty(n_envs, dtype=np.int64)
+		self.masks = np.empty(n_envs, dtype=np.int64)
+		self.n_picked = np.empty(n_envs, dtype=np.int64)
+		self.credits = np.empty(n_envs, dtype=np.float64)
+		self.dones = np.zeros(n_envs, dtype=bool)
+		self.episode_steps = np.zeros(n_envs, dtype=np.int64)
+
+		# a 'visit_counts.VisitCounts' that every step of every copy is counted in, if set
+		self.visit_counts = None
+
+		self.reset()
+
+	def _compile(self, env):
+		"""Take the per cell tables from the environment's compiled layout"""
+		tables = env.compiled_layout
+		self.next_cell = tables.next_cell
+		self.has_object = tables.has_object
+		self.object_reward = tables.object_reward
+		self.terminal = tables.terminal
+		self.pickable_bit = tables.pickable_bit
+
+		# states are encoded the same way as 'Env.calc_state()' does
+		self.encoder = env.encoder
+		self.n_states = self.encoder.n_states
+		self.default_rewards = env.default_rewards
+		self.born_cell = env.grid.insure_id(env.agent.born_at)
+		self.born_credit = env.agent.credit
+
+	def _reset_where(self, which):
+		self.cells[which] = self.born_cell
+		self.masks[which] = 0
+		self.n_picked[which] = 0
+		self.credits[which] = 0
+		self.episode_steps[which] = 0
+
+	def reset(self):
+		"""Reset all copies, return their starting states"""
+		self._reset_where(slice(None))
+		self.credits[:] = self.born_credit
+		self.dones[:] = False
+		return self.states
+
+	@property
+	def states(self):
+		return self.cells + self.n_cells * self.masks
+
+	def sample_actions(self):
+		"""Uniform randomly pick an action index for every copy"""
+		return self.rng.integers(self.n_actions, self.n_envs)
+
+	def step(self, actions):
+		"""Move every copy by one action.
+		parameters:
+			actions:  array of action indexes(see 'ActionSpace.action_index'), one per copy
+		return:
+			(rewards, states_next, terminals), states_next of a copy that reached a terminal is
+			the terminal state, that copy is already reset and '.states' gives its new starting state
+		"""
+		cells = self.cells
+		masks = self.masks
+		cells_next = self.next_cell[cells, actions]
+
+		if self.visit_counts != None:
+			self.visit_counts.add_many(cells + self.n_cells * masks, actions)
+
+		# an object gives reward when agent leaves its cell, unless it was picked up in this episode
+		bits = self.pickable_bit[cells]
+		present = self.has_object[cells] & ((masks & bits) == 0)
+		rewards = np.where(present, self.object_reward[cells], self.default_rewards)
+
+		bits = self.pickable_bit[cells_next]
+		present = self.has_object[cells_next] & ((masks & bits) == 0)
+		terminals = present & self.terminal[cells_next]
+
+		# pick up objects
+		picked = present & (bits != 0)
+		masks |= np.where(picked, bits, 0)
+		self.n_picked += picked
+		self.credits[picked & (self.n_picked == Agent.full_bag)] = Agent.full_bag_credit
+
+		cells[:] = cells_next
+		states_next = cells + self.n_cells * masks
+
+		rewards += np.where(terminals, self.credits, 0)
+		self.episode_steps += 1
+
+		# automatically start a new episode for finished copies
+		self.dones[:] = terminals
+		if terminals.any():
+			self._reset_where(terminals)
+
+		return (rewards, states_next, terminals)
+
+
+if __name__ == '__main__':
+	import time
+	from grid_env import Env
+
+	env = Env((8, 8), headless=True)
+	env.agent.born_at = (7, 0)
+	for i in range(8):
+		env.add_object('yellow_star', (i, i), reward=100, pickable=True)
+	env.add_object('red_ball', (0, 7), terminal=True)
+
+	vec_env = VecGridEnv(env, 1024)
+	print("number of states:", vec_env.n_states)
+
+	n_steps = 1000
+	episodes = 0
+	start = time.time()
+	for _ in range(n_steps):
+		rewards, states_next, terminals = vec_env.step(vec_env.sample_actions())
+		episodes += int(terminals.sum())
+	elapsed = time.time() - start
+	print("{} transitions in {:.3f} seconds, {} episodes finished".format(n_steps * vec_env.n_envs, elapsed, episodes))